@@ -0,0 +1,237 @@
+
+import sys, json, struct
+from array import array
+from itertools import accumulate
+
+
+# Binary material-graph snapshots. Version 3 libraries stored large bodies as
+# <id>.mlg in this format; LibraryStore now writes JSON bodies and only reads
+# these (sparse snapshots rarely reached the size where decoding beat json).
+#
+# A snapshot is {"material", "nodes": {node: {"type", "attrs": {attr: {"name",
+# "value", "type"}}, ...}}, "connections": [{"src", "dst"}], "sparse"}. Stored
+# by column instead: strings interned once (the common keys / types / node
+# types below are implied and never written), nodes and attributes as packed
+# index arrays, plugs as (node, attr) index pairs, and attribute values split by
+# kind into typed arrays. Floats that survive float32 are stored as float32.
+# Anything outside those shapes (extra keys, odd values, unusual nodes) rides
+# along in a small JSON header, so decode(encode(g)) == json.loads(json.dumps(g)).
+#
+#   MAGIC | <BIIII: index width, header bytes, nodes, attrs, connections
+#         | header JSON | columns (lengths follow from the counts)
+
+MAGIC  = b"MLG\x01"
+_HEAD  = struct.Struct("<BIIII")
+_F32   = struct.Struct("<f")
+_SWAP  = sys.byteorder != "little"
+
+# implied string table prefix; part of the format - append only with a new MAGIC
+_COMMON = (None, "material", "nodes", "connections", "sparse", "type", "attrs", "embed",
+           "name", "path", "colorSpace", "blob", "bool", "byte", "char", "short", "long",
+           "enum", "float", "double", "float2", "float3", "double2", "double3", "long2",
+           "long3", "short2", "doubleLinear", "doubleAngle", "time", "string", "matrix",
+           "file", "place2dTexture", "lambert", "blinn", "phong", "surfaceShader",
+           "aiStandardSurface", "standardSurface", "aiImage", "ramp", "bump2d",
+           "aiNormalMap", "colorCorrect", "aiColorCorrect", "remapValue", "sRGB", "Raw",
+           "outColor", "outAlpha", "outUV", "outUvFilterSize", "uvCoord", "uvFilterSize",
+           "coverage", "translateFrame", "rotateFrame", "mirrorU", "mirrorV", "stagger",
+           "wrapU", "wrapV", "repeatUV", "offset", "rotateUV", "noiseUV", "vertexUvOne",
+           "vertexUvTwo", "vertexUvThree", "vertexCameraOne", "fileTextureName",
+           "alphaGain", "alphaOffset", "colorGain", "colorOffset", "defaultColor",
+           "alphaIsLuminance", "baseColor", "base", "normalCamera", "bumpValue", "color",
+           "transparency", "ambientColor", "incandescence", "diffuse", "specular",
+           "specularColor", "specularRoughness", "metalness", "emission", "emissionColor",
+           "opacity", "coat", "sheen", "subsurface", "transmission")
+
+# attribute value kinds
+K_F32, K_F64, K_INT, K_BOOL, K_STR, K_V32, K_V64, K_JSON = range(8)
+_INT32 = (-(1 << 31), (1 << 31) - 1)
+
+
+class _Strings(object):
+
+    def __init__(self):
+        self.index = {s: i for i, s in enumerate(_COMMON)}
+        self.items = []              # graph-local strings, indexed after _COMMON
+
+    def ref(self, s):
+        i = self.index.get(s)
+        if i is None:
+            i = self.index[s] = len(_COMMON) + len(self.items)
+            self.items.append(s)
+        return i
+
+
+def _is_f32(v):
+    try: return _F32.unpack(_F32.pack(v))[0] == v
+    except (OverflowError, struct.error): return False
+
+
+def _packed_attrs(attrs):
+    # the capture shape: {name: {"name": name, "value": v, "type": str | None}}
+    if not isinstance(attrs, dict): return False
+    for k, p in attrs.items():
+        if not isinstance(k, str) or not isinstance(p, dict) or len(p) != 3 or p.get("name") != k: return False
+        if "value" not in p or not (p.get("type") is None or isinstance(p.get("type"), str)): return False
+    return True
+
+
+def _split_plug(plug):
+    if not isinstance(plug, str): return None
+    node, dot, attr = plug.partition(".")
+    return (node, attr) if dot else None
+
+
+def _packed_conns(conns):
+    if not isinstance(conns, list): return False
+    for c in conns:
+        if not isinstance(c, dict) or len(c) != 2: return False
+        if _split_plug(c.get("src")) is None or _split_plug(c.get("dst")) is None: return False
+    return True
+
+
+def encode_graph(graph) -> bytes:
+    graph = graph or {}
+    st = _Strings()
+    n_name, n_type, n_cnt = [], [], []
+    a_name, a_type, kinds = [], [], array("B")
+    f32, f64, ints, bools, strs = array("f"), array("d"), array("i"), array("B"), []
+    v_len32, v_len64, v32, v64 = array("B"), array("B"), array("f"), array("d")
+    conn, generic, whole, extras = [], [], [], []
+
+    nodes = graph.get("nodes")
+    if not isinstance(nodes, dict): nodes = None
+    for i, (node, spec) in enumerate((nodes or {}).items()):
+        n_name.append(st.ref(node))
+        if not (isinstance(spec, dict) and isinstance(spec.get("type"), str) and _packed_attrs(spec.get("attrs"))):
+            n_type.append(0); n_cnt.append(-1); whole.append([i, spec])
+            continue
+        n_type.append(st.ref(spec["type"]))
+        attrs = spec["attrs"]
+        n_cnt.append(len(attrs))
+        rest = {k: v for k, v in spec.items() if k not in ("type", "attrs")}
+        if rest: extras.append([i, rest])
+        for name, p in attrs.items():
+            a_name.append(st.ref(name)); a_type.append(st.ref(p["type"]))
+            v, tv = p["value"], type(p["value"])
+            if tv is float:
+                if _is_f32(v): kinds.append(K_F32); f32.append(v)
+                else:          kinds.append(K_F64); f64.append(v)
+            elif tv is bool:
+                kinds.append(K_BOOL); bools.append(v)
+            elif tv is int and _INT32[0] <= v <= _INT32[1]:
+                kinds.append(K_INT); ints.append(v)
+            elif tv is str:
+                kinds.append(K_STR); strs.append(st.ref(v))
+            elif tv in (list, tuple) and 0 < len(v) < 256 and all(type(x) is float for x in v):
+                if all(_is_f32(x) for x in v): kinds.append(K_V32); v32.extend(v); v_len32.append(len(v))
+                else:                          kinds.append(K_V64); v64.extend(v); v_len64.append(len(v))
+            else:
+                kinds.append(K_JSON); generic.append(v)
+
+    conns = graph.get("connections")
+    packed_conns = conns is not None and _packed_conns(conns)
+    if packed_conns:
+        for c in conns:
+            for plug in (c["src"], c["dst"]):
+                node, attr = _split_plug(plug)
+                conn.append(st.ref(node)); conn.append(st.ref(attr))
+
+    head = {k: v for k, v in graph.items()
+            if not (k == "nodes" and nodes is not None) and not (k == "connections" and packed_conns)}
+    header = [st.items, [st.ref(k) for k in graph], head, whole, extras, generic,
+              int(nodes is not None) | (2 if packed_conns else 0)]
+    hbytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    cnt_max = max(n_cnt) if n_cnt else 0
+    wide = len(_COMMON) + len(st.items) >= 0xFFFF or cnt_max >= 0xFFFF
+    n_cnt = [(0xFFFFFFFF if wide else 0xFFFF) if c < 0 else c for c in n_cnt]
+    # one block per element type; lengths follow from the header counts and kinds
+    blocks = [kinds,
+              array("I" if wide else "H", n_name + n_type + n_cnt + a_name + a_type + strs + conn),
+              bools + v_len32 + v_len64, ints, f32 + v32, f64 + v64]
+    n_conns = len(conns) if packed_conns else 0
+    out = [MAGIC, _HEAD.pack(int(wide), len(hbytes), len(n_name), len(a_name), n_conns), hbytes]
+    for arr in blocks:
+        if _SWAP and arr.itemsize > 1: arr = array(arr.typecode, arr); arr.byteswap()
+        out.append(arr.tobytes())
+    return b"".join(out)
+
+
+def decode_graph(data) -> dict:
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a binary material graph")
+    data = memoryview(data)
+    wide, hlen, n_nodes, n_attrs, n_conns = _HEAD.unpack_from(data, len(MAGIC))
+    pos = len(MAGIC) + _HEAD.size
+    items, order, head, whole, extras, generic, flags = json.loads(bytes(data[pos:pos + hlen]))
+    pos += hlen
+
+    kinds = array("B", data[pos:pos + n_attrs]).tolist(); pos += n_attrs
+    c = [kinds.count(k) for k in range(K_JSON)] if n_attrs else [0] * K_JSON
+    blocks = []
+    for code, n in (("I" if wide else "H", 3 * n_nodes + 2 * n_attrs + c[K_STR] + 4 * n_conns),
+                    ("B", c[K_BOOL] + c[K_V32] + c[K_V64]), ("i", c[K_INT]), ("f", None), ("d", None)):
+        if n is None:               # float blocks: scalars then the flattened vectors
+            small = blocks[1]
+            lens = small[c[K_BOOL]:c[K_BOOL] + c[K_V32]] if code == "f" else small[c[K_BOOL] + c[K_V32]:]
+            n = c[K_F32 if code == "f" else K_F64] + sum(lens)
+        if not n:
+            blocks.append([]); continue
+        arr = array(code)
+        end = pos + n * arr.itemsize
+        arr.frombytes(data[pos:end]); pos = end
+        if _SWAP and arr.itemsize > 1: arr.byteswap()
+        blocks.append(arr.tolist())
+    idx, small, ints, fl, db = blocks
+
+    S = _COMMON + tuple(items)
+    o = n_nodes * 3
+    vals = names = types = ()
+    if n_attrs:
+        names = [S[i] for i in idx[o:o + n_attrs]]; o += n_attrs
+        types = [S[i] for i in idx[o:o + n_attrs]]; o += n_attrs
+        nb, n32 = c[K_BOOL], c[K_V32]
+        lens32, lens64 = small[nb:nb + n32], small[nb + n32:]
+        v32, v64 = fl[c[K_F32]:], db[c[K_F64]:]
+        sources = (fl, db, ints, [b != 0 for b in small[:nb]], [S[i] for i in idx[o:o + c[K_STR]]],
+                   [v32[e - n:e] for e, n in zip(accumulate(lens32), lens32)] if lens32 else (),
+                   [v64[e - n:e] for e, n in zip(accumulate(lens64), lens64)] if lens64 else (), generic)
+        o += c[K_STR]
+        nexts = [iter(s).__next__ for s in sources]
+        vals = [nexts[k]() for k in kinds]
+
+    graph = {}
+    for k in order:
+        k = S[k]
+        if k == "nodes" and flags & 1:
+            nodes = graph[k] = {}
+            whole, extras = dict(whole), dict(extras)
+            none, a = 0xFFFFFFFF if wide else 0xFFFF, 0
+            for i in range(n_nodes):
+                cnt = idx[2 * n_nodes + i]
+                if cnt == none:
+                    nodes[S[idx[i]]] = whole[i]; continue
+                b = a + cnt
+                spec = {"type": S[idx[n_nodes + i]],
+                        "attrs": {n: {"name": n, "value": v, "type": t}
+                                  for n, v, t in zip(names[a:b], vals[a:b], types[a:b])}}
+                a = b
+                if i in extras: spec.update(extras[i])
+                nodes[S[idx[i]]] = spec
+        elif k == "connections" and flags & 2:
+            conn = idx[o:]
+            plugs = [S[n] + "." + S[t] for n, t in zip(conn[0::2], conn[1::2])]
+            graph[k] = [{"src": s, "dst": d} for s, d in zip(plugs[0::2], plugs[1::2])]
+        else:
+            graph[k] = head[k]
+    return graph
+
+
+# ---- conversion to / from the JSON snapshot ----
+def graph_from_json(text) -> bytes:
+    return encode_graph(json.loads(text))
+
+
+def graph_to_json(data, indent=None) -> str:
+    return json.dumps(decode_graph(data), ensure_ascii=False, indent=indent)
@@ -0,0 +1,241 @@
+
+import bisect
+
+try:
+    from . import MaliStore as ms  # type: ignore
+except Exception:
+    import MaliStore as ms
+
+
+# Substring search over the short strings a material is known by: its name,
+# folder, assets, node types and texture files (ms.graph_terms). Postings are
+# token -> material ids, and trigrams index the distinct tokens only, so a
+# query walks the vocabulary rather than every material. version moves only
+# when some material gains or loses a token, so callers can tell whether a
+# cached query result is stale.
+
+class SearchIndex(object):
+
+    def __init__(self):
+        self.version = 0
+        self.clear()
+
+    def clear(self):
+        self.docs     = {}        # material id -> {token: occurrences}
+        self.postings = {}        # token -> set of material ids
+        self.grams    = {}        # trigram -> set of tokens
+        self.version += 1
+
+    @staticmethod
+    def _grams(tok):
+        return {tok[i:i + 3] for i in range(len(tok) - 2)}
+
+    def add(self, mid, words):
+        doc = self.docs.setdefault(mid, {})
+        for w in words:
+            tok = (w or "").lower()
+            if not tok: continue
+            doc[tok] = doc.get(tok, 0) + 1
+            if doc[tok] > 1: continue
+            self.version += 1
+            ids = self.postings.get(tok)
+            if ids is None:
+                ids = self.postings[tok] = set()
+                for g in self._grams(tok): self.grams.setdefault(g, set()).add(tok)
+            ids.add(mid)
+
+    def discard(self, mid, words):
+        doc = self.docs.get(mid)
+        if doc is None: return
+        for w in words:
+            tok = (w or "").lower()
+            n = doc.get(tok)
+            if not n: continue
+            if n > 1: doc[tok] = n - 1
+            else:     del doc[tok]; self._drop(mid, tok)
+
+    def remove(self, mid):
+        for tok in self.docs.pop(mid, None) or ():
+            self._drop(mid, tok)
+
+    def _drop(self, mid, tok):
+        self.version += 1
+        ids = self.postings.get(tok)
+        if ids is None: return
+        ids.discard(mid)
+        if ids: return
+        del self.postings[tok]
+        for g in self._grams(tok):
+            toks = self.grams.get(g)
+            if toks is None: continue
+            toks.discard(tok)
+            if not toks: del self.grams[g]
+
+    def tokens_matching(self, term):
+        if len(term) < 3:
+            return [t for t in self.postings if term in t]
+        # every match carries all of term's trigrams: verify the rarest one's tokens
+        rarest = min((self.grams.get(g, ()) for g in self._grams(term)), key=len)
+        return [t for t in rarest if term in t]
+
+    def query(self, text):
+        # every whitespace-separated term must be a substring of some token;
+        # None for an empty query (no filter)
+        terms = (text or "").lower().split()
+        if not terms: return None
+        result = None
+        for term in terms:
+            post = self.postings
+            ids = set().union(*[post[t] for t in self.tokens_matching(term)])
+            result = ids if result is None else result & ids
+            if not result: break
+        return result
+
+
+# In-memory lookups over lib_data ({folder: [material dict]}). Materials are
+# keyed by their persistent "id" (saved in the library), never by id(dict),
+# so an id stays valid across save/load and drag/drop payloads.
+
+class LibraryIndex(object):
+
+    def __init__(self):
+        self.search = SearchIndex()
+        self.clear()
+
+    def clear(self):
+        self.by_id    = {}        # material id -> material dict
+        self.folder   = {}        # material id -> folder name
+        self.by_name  = {}        # material name -> {material id: None}, in insertion order (names may repeat)
+        self.by_asset = {}        # scene object -> set of material ids
+        self._assets  = {}        # material id -> set of its objects (mirrors m["assets"])
+        self.search.clear()
+
+    def rebuild(self, lib_data):
+        self.clear()
+        for folder, mats in lib_data.items():
+            for m in mats:
+                self.add(m, folder)
+
+    # ---- lookups ----
+    def get(self, mat_id):
+        return self.by_id.get(mat_id)
+
+    def folder_of(self, mat_id):
+        return self.folder.get(mat_id)
+
+    def ids_for_name(self, name):
+        return list(self.by_name.get(name, ()))
+
+    def materials_with(self, obj):
+        return [self.by_id[mid] for mid in self.by_asset.get(obj, ()) if mid in self.by_id]
+
+    # ---- edits ----
+    def add(self, m, folder):
+        if not m.get("id"): m["id"] = ms.new_material_id()
+        mid = m["id"]
+        self.by_id[mid] = m; self.folder[mid] = folder
+        if m.get("name"): self.by_name.setdefault(m["name"], {})[mid] = None
+        self.search.add(mid, [m.get("name"), folder] + list(m.get("terms") or ()))
+        self.sync_assets(m)
+        return mid
+
+    def discard(self, m):
+        mid = m.get("id")
+        if self.by_id.pop(mid, None) is None: return
+        self.folder.pop(mid, None)
+        self._unname(m.get("name"), mid)
+        for obj in self._assets.pop(mid, ()):
+            self._unlink(obj, mid)
+        self.search.remove(mid)
+
+    def move(self, m, folder):
+        mid = m["id"]
+        self.search.discard(mid, [self.folder.get(mid)]); self.search.add(mid, [folder])
+        self.folder[mid] = folder
+
+    def rename_folder(self, mats, new):
+        for m in mats: self.move(m, new)
+
+    def rename(self, m, old_name):
+        mid = m["id"]
+        self._unname(old_name, mid)
+        if m.get("name"): self.by_name.setdefault(m["name"], {})[mid] = None
+        self.search.discard(mid, [old_name]); self.search.add(mid, [m.get("name")])
+
+    def set_terms(self, m, terms):
+        mid = m["id"]
+        if mid in self.by_id: self.search.discard(mid, m.get("terms") or ())
+        m["terms"] = list(terms)
+        if mid in self.by_id: self.search.add(mid, m["terms"])
+
+    def sync_assets(self, m):
+        # re-index m["assets"] after it was replaced wholesale; costs len(old) + len(new).
+        # link / unlink / reassign below edit both sides in place instead.
+        mid = m["id"]
+        if isinstance(m.get("assets"), list): m["assets"].sort()    # legacy / hand-edited lists; link bisects
+        old, new = self._assets.get(mid, set()), set(m.get("assets") or ())
+        if old == new: return
+        for obj in old - new: self._unlink(obj, mid)
+        for obj in new - old: self.by_asset.setdefault(obj, set()).add(mid)
+        self.search.discard(mid, old - new); self.search.add(mid, new - old)
+        self._assets[mid] = new
+
+    # Asset edits cost O(objects touched * log len(assets)): m["assets"] is kept
+    # sorted, so a single object is found / placed by bisection.
+    def link(self, m, objects):
+        mid, lst = m["id"], m.setdefault("assets", [])
+        if mid not in self._assets: self.sync_assets(m)
+        have = self._assets.setdefault(mid, set())
+        added = []
+        for obj in objects:
+            if obj in have: continue
+            have.add(obj); self.by_asset.setdefault(obj, set()).add(mid)
+            bisect.insort(lst, obj); added.append(obj)
+        self.search.add(mid, added)
+        return added
+
+    def unlink(self, m, objects):
+        mid, lst = m["id"], m.setdefault("assets", [])
+        if mid not in self._assets: self.sync_assets(m)
+        have = self._assets.get(mid, set())
+        removed = []
+        for obj in objects:
+            if obj not in have: continue
+            have.discard(obj); self._unlink(obj, mid)
+            i = bisect.bisect_left(lst, obj)
+            if i < len(lst) and lst[i] == obj: lst.pop(i)
+            else:                              lst.remove(obj)     # list saved unsorted
+            removed.append(obj)
+        self.search.discard(mid, removed)
+        return removed
+
+    def rename_asset(self, old, new):
+        # a scene object was renamed; returns the materials that list it
+        mats = self.materials_with(old)
+        for m in mats:
+            self.unlink(m, [old]); self.link(m, [new])
+        return mats
+
+    def reassign(self, objects, m):
+        # objects now belong to m alone; returns the other materials that lost some
+        objects = list(dict.fromkeys(objects))
+        losers = {}
+        for obj in objects:
+            for mid in self.by_asset.get(obj, ()):
+                if mid != m["id"]: losers.setdefault(mid, []).append(obj)
+        for mid, objs in losers.items():
+            if mid in self.by_id: self.unlink(self.by_id[mid], objs)
+        self.link(m, objects)
+        return [self.by_id[mid] for mid in losers if mid in self.by_id]
+
+    def _unname(self, name, mid):
+        ids = self.by_name.get(name)
+        if ids is None: return
+        ids.pop(mid, None)
+        if not ids: self.by_name.pop(name)
+
+    def _unlink(self, obj, mid):
+        owners = self.by_asset.get(obj)
+        if owners is None: return
+        owners.discard(mid)
+        if not owners: self.by_asset.pop(obj)
@@ -0,0 +1,165 @@
+
+import os, sys, json, time, threading, functools
+
+
+# Opt-in timing for the library's hot paths. A span records call count,
+# cumulative and worst time under a name; maya.cmds calls are counted the same
+# way ("cmds.<command>") while recording is on. Off by default (MLI_PROFILE=1
+# turns it on at import): a disabled @timed costs one flag test per call, and
+# the cmds proxy is only swapped in while enabled.
+
+enabled = os.environ.get("MLI_PROFILE", "") not in ("", "0")
+
+_stats = {}               # name -> [calls, total s, max s]
+_lock  = threading.Lock()
+_hosts = {}               # module name -> module whose global "cmds" is proxied
+_since = time.time()
+
+
+def record(name, seconds):
+    with _lock:
+        s = _stats.get(name)
+        if s is None: _stats[name] = [1, seconds, seconds]
+        else:
+            s[0] += 1; s[1] += seconds
+            if seconds > s[2]: s[2] = seconds
+
+
+class _Span(object):
+    __slots__ = ("name", "t")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.t)
+        return False
+
+
+class _NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    # with span("store.save"): ...
+    return _Span(name) if enabled else _NO_SPAN
+
+
+def timed(name):
+    # decorator form of span(); the flag is read per call so toggling applies live
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if not enabled:
+                return fn(*a, **kw)
+            t = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                record(name, time.perf_counter() - t)
+        return wrapper
+    return deco
+
+
+# ---- maya.cmds call counting ----
+class _CmdsProxy(object):
+    # stands in for maya.cmds in a host module while recording
+
+    def __init__(self, cmds):
+        self._cmds = cmds
+        self._fns  = {}
+
+    def __getattr__(self, name):
+        w = self._fns.get(name)
+        if w is not None: return w
+        fn = getattr(self._cmds, name)
+        if not callable(fn): return fn
+        key = "cmds." + name
+        def w(*a, **kw):
+            t = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                record(key, time.perf_counter() - t)
+        self._fns[name] = w
+        return w
+
+
+def _real_cmds(mod):
+    c = getattr(mod, "cmds", None)
+    return c._cmds if isinstance(c, _CmdsProxy) else c
+
+
+def watch_cmds(module_name):
+    # called by a module that does "import maya.cmds as cmds" at its top level
+    mod = sys.modules.get(module_name)
+    if mod is None or _real_cmds(mod) is None: return
+    _hosts[module_name] = mod
+    _swap(mod, enabled)
+
+
+def _swap(mod, on):
+    real = _real_cmds(mod)
+    if real is None: return
+    mod.cmds = _CmdsProxy(real) if on else real
+
+
+def set_enabled(on):
+    global enabled
+    enabled = bool(on)
+    for mod in list(_hosts.values()):
+        _swap(mod, enabled)
+
+
+def reset():
+    global _since
+    with _lock:
+        _stats.clear()
+    _since = time.time()
+
+
+# ---- report ----
+def rows():
+    # [(name, calls, total s, avg s, max s)], slowest total first
+    with _lock:
+        items = [(k, v[0], v[1], v[2]) for k, v in _stats.items()]
+    out = [(k, n, tot, tot / n if n else 0.0, mx) for k, n, tot, mx in items]
+    out.sort(key=lambda r: r[2], reverse=True)
+    return out
+
+
+def report_text():
+    lines = ["%-40s %8s %12s %10s %10s" % ("span", "calls", "total ms", "avg ms", "max ms")]
+    for name, n, tot, avg, mx in rows():
+        lines.append("%-40s %8d %12.2f %10.3f %10.3f" % (name, n, tot * 1e3, avg * 1e3, mx * 1e3))
+    return "\n".join(lines)
+
+
+def report_dict():
+    return {"since": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(_since)),
+            "spans": {name: {"calls": n, "total_s": round(tot, 6), "avg_s": round(avg, 6), "max_s": round(mx, 6)}
+                      for name, n, tot, avg, mx in rows()}}
+
+
+def export(path):
+    # .json -> structured report, anything else -> the text table
+    if path.lower().endswith(".json"):
+        data = json.dumps(report_dict(), indent=2, sort_keys=True)
+    else:
+        data = report_text() + "\n"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
+    return path
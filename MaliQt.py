@@ -0,0 +1,271 @@
+
+try:
+    from PySide6 import QtCore, QtGui, QtWidgets
+except Exception:
+    from PySide2 import QtCore, QtGui, QtWidgets
+
+import base64, functools
+from collections import OrderedDict
+
+try:
+    from . import MaliProfile as mp  # type: ignore
+except Exception:
+    import MaliProfile as mp
+
+# Qt-only helpers of the dialog (thumbnail cache, preview painting, image
+# picking). Only MaliUI imports this; MaliUtil stays importable without PySide.
+
+
+# ---- decoded thumbnail cache (process-wide, LRU under a byte budget) ----
+@mp.timed("thumb.decode")
+def _decode_sizes(data, sizes):
+    
+    # thread-safe (QImage only): [(wh, QImage scaled to fit wh)] for every size
+    img = QtGui.QImage()
+    try: img.loadFromData(data or b"")
+    except Exception: pass
+    out = []
+    for wh in sizes:
+        fits = img.isNull() or (img.width() <= wh[0] and img.height() <= wh[1])
+        out.append((wh, img if fits else img.scaled(wh[0], wh[1], QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)))
+    return out
+
+
+class _ThumbSignals(QtCore.QObject):
+    decoded = QtCore.Signal(object, object) # task, [(wh, QImage)] or None when cancelled
+    ready   = QtCore.Signal(str)            # key is resident in the cache
+
+
+class _ThumbTask(QtCore.QRunnable):
+
+    def __init__(self, key, load_bytes, sizes, signals):
+        super().__init__()
+        self.setAutoDelete(False)       # ThumbCache._pending keeps it alive
+        self.key, self.load_bytes, self.sizes, self.signals = key, load_bytes, sizes, signals
+        self.cancelled = False
+
+    def run(self):
+        out = None
+        if not self.cancelled:
+            try: out = _decode_sizes(self.load_bytes(), self.sizes)
+            except Exception: out = _decode_sizes(b"", self.sizes)
+        try: self.signals.decoded.emit(self, out)
+        except RuntimeError: pass       # cache torn down (module reload / shutdown)
+
+
+class ThumbCache(object):
+    # (content key, w, h) -> QPixmap. A thumbnail is decoded once and scaled
+    # to every registered size, so the tree icon and the card preview of the
+    # same image never decode it again while it stays resident.
+    # request() decodes on a QThreadPool; signals().ready fires per key.
+    THREADS = 2
+
+    def __init__(self, budget_bytes=48 << 20, sizes=()):
+        self.budget = int(budget_bytes)
+        self.sizes = []
+        self._pms = OrderedDict()
+        self._used = 0
+        self._pending = {}              # key -> _ThumbTask
+        self._sig = None
+        self._threads = None
+        for sz in sizes: self.add_size(sz)
+
+    def signals(self):
+        if self._sig is None:
+            self._sig = _ThumbSignals()
+            self._sig.decoded.connect(self._on_decoded)
+        return self._sig
+
+    def _pool(self):
+        if self._threads is None:
+            self._threads = QtCore.QThreadPool()
+            self._threads.setMaxThreadCount(self.THREADS)
+        return self._threads
+
+    def request(self, key, load_bytes, priority=0):
+        # load_bytes() runs on a worker thread
+        old = self._pending.get(key)
+        if not key or (old is not None and not old.cancelled): return
+        task = _ThumbTask(key, load_bytes, list(self.sizes), self.signals())
+        self._pending[key] = task
+        self._pool().start(task, priority)
+
+    def cancel(self, key):
+        task = self._pending.get(key)
+        if task is None: return False
+        task.cancelled = True
+        if hasattr(self._pool(), "tryTake") and self._pool().tryTake(task):
+            self._pending.pop(key, None)
+        return True
+
+    def _on_decoded(self, task, images):
+        key = task.key
+        if self._pending.get(key) is task: self._pending.pop(key)
+        if images is None: return
+        for wh, img in images:
+            self.put(key, wh, QtGui.QPixmap.fromImage(img))
+        self.signals().ready.emit(key)
+
+    def add_size(self, size):
+        wh = (int(size.width()), int(size.height())) if hasattr(size, "width") else tuple(size)
+        if wh not in self.sizes: self.sizes.append(wh)
+        return wh
+
+    def set_budget(self, budget_bytes):
+        self.budget = int(budget_bytes); self._evict()
+
+    def clear(self):
+        self._pms.clear(); self._used = 0
+
+    @staticmethod
+    def _cost(pm):
+        return pm.width() * pm.height() * max(1, pm.depth() // 8)
+
+    def get(self, key, size):
+        size = (int(size.width()), int(size.height())) if hasattr(size, "width") else tuple(size)
+        pm = self._pms.get((key,) + size)
+        if pm is not None: self._pms.move_to_end((key,) + size)
+        return pm
+
+    def put(self, key, size, pm):
+        k = (key,) + size
+        old = self._pms.pop(k, None)
+        if old is not None: self._used -= self._cost(old)
+        self._pms[k] = pm; self._used += self._cost(pm)
+        self._evict()
+
+    def _evict(self):
+        while self._used > self.budget and len(self._pms) > 1:
+            _k, pm = self._pms.popitem(last=False)
+            self._used -= self._cost(pm)
+
+
+THUMB_CACHE = ThumbCache()
+
+
+class ImagePreview(QtWidgets.QLabel):
+    LOAD_MAX = 256          # originals are downsampled to this (x DPR) when set
+
+    def __init__(self, w=200, h=160, parent=None, radius=90):
+        super().__init__(parent)
+        self.setMinimumSize(w, h)
+        self.setAlignment(QtCore.Qt.AlignCenter)
+        self.setStyleSheet("background: transparent;")
+        self._b64 = ""
+        self._pm  = QtGui.QPixmap()
+        self._radius = int(radius)
+        self._bg_col = QtGui.QColor("#2b2b2b")
+        self._border_col = QtGui.QColor("#555555")
+        self._frame, self._frame_key = QtGui.QPixmap(), None
+        self._loading = False
+
+    def _load_bound(self):
+        side = max(self.LOAD_MAX, self.minimumWidth(), self.minimumHeight())
+        return int(side * self.devicePixelRatioF())
+
+    def set_image_b64(self, b64str):
+        self._b64 = b64str or ""
+        img = QtGui.QImage()
+        if self._b64:
+            try:
+                img.loadFromData(QtCore.QByteArray.fromBase64(QtCore.QByteArray(self._b64.encode("utf-8"))))
+            except Exception:
+                pass
+        bound = self._load_bound()
+        if img.width() > bound or img.height() > bound:
+            img = img.scaled(bound, bound, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+        self._set(QtGui.QPixmap.fromImage(img) if not img.isNull() else QtGui.QPixmap())
+
+    def set_pixmap(self, pm):
+        # None = still loading: plain placeholder without the "No Preview" text
+        self._b64 = ""
+        self._loading = pm is None
+        pm = pm if pm is not None else QtGui.QPixmap()
+        bound = self._load_bound()
+        if pm.width() > bound or pm.height() > bound:
+            pm = pm.scaled(bound, bound, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+        self._set(pm)
+
+    def _set(self, pm):
+        if self._b64 or not pm.isNull(): self._loading = False
+        self._pm = pm
+        self._frame_key = None
+        self.update()
+
+    def paintEvent(self, e):
+        # the rounded, clipped, scaled frame is rendered once per (size, image)
+        dpr = self.devicePixelRatioF()
+        key = (self.width(), self.height(), dpr, self._pm.cacheKey(), self._loading)
+        if key != self._frame_key:
+            frame = QtGui.QPixmap(int(self.width() * dpr), int(self.height() * dpr))
+            frame.setDevicePixelRatio(dpr); frame.fill(QtCore.Qt.transparent)
+            fp = QtGui.QPainter(frame)
+            paint_preview(fp, self.rect().adjusted(1, 1, -1, -1), self._pm, self._radius, self._bg_col, self._border_col,
+                          "" if self._loading else "No Preview")
+            fp.end()
+            self._frame, self._frame_key = frame, key
+        p = QtGui.QPainter(self); p.drawPixmap(0, 0, self._frame); p.end()
+
+    def resizeEvent(self, e):
+        super().resizeEvent(e); self.update()
+
+
+def paint_preview(p, rect, pm, radius=90, bg=None, border=None, text="No Preview"):
+    
+    # shared by ImagePreview and the painted (non-widget) material cards
+    p.save(); p.setRenderHint(QtGui.QPainter.Antialiasing, True)
+    path = QtGui.QPainterPath(); r = float(radius)
+    path.addRoundedRect(QtCore.QRectF(rect), r, r)
+    p.fillPath(path, bg or QtGui.QColor("#2b2b2b"))
+    if pm is not None and not pm.isNull():
+        p.save(); p.setClipPath(path)
+        scaled = pm if pm.width() <= rect.width() and pm.height() <= rect.height() and \
+            (pm.width() == rect.width() or pm.height() == rect.height()) else \
+            pm.scaled(rect.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+        x = rect.x() + (rect.width()-scaled.width())*0.5
+        y = rect.y() + (rect.height()-scaled.height())*0.5
+        p.drawPixmap(int(x), int(y), scaled); p.restore()
+    else:
+        p.setPen(QtGui.QPen(QtGui.QColor("#aaaaaa")))
+        p.drawText(rect, QtCore.Qt.AlignCenter, text)
+    pen = QtGui.QPen(border or QtGui.QColor("#555555")); pen.setWidth(1); p.setPen(pen); p.drawPath(path)
+    p.restore()
+
+
+THUMB_MAX = 256
+
+@functools.lru_cache(maxsize=1)
+def _thumb_format():
+    
+    fmts = {bytes(f).decode("ascii", "ignore").lower() for f in QtGui.QImageWriter.supportedImageFormats()}
+    return "webp" if "webp" in fmts else "png"
+
+
+def normalize_thumbnail(data: bytes, max_side=THUMB_MAX) -> bytes:
+    
+    # <= max_side px, re-encoded as WebP (PNG when Qt has no WebP writer);
+    # the original is kept when it is already small and compact. Thread-safe.
+    img = QtGui.QImage()
+    try: img.loadFromData(data or b"")
+    except Exception: pass
+    if img.isNull():
+        return data
+    scaled = img.width() > max_side or img.height() > max_side
+    if scaled:
+        img = img.scaled(max_side, max_side, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+    fmt = _thumb_format()
+    ba = QtCore.QByteArray(); buf = QtCore.QBuffer(ba); buf.open(QtCore.QIODevice.WriteOnly)
+    ok = img.save(buf, fmt, 85 if fmt == "webp" else -1); buf.close()
+    out = bytes(ba)
+    return out if ok and out and (scaled or len(out) < len(data)) else data
+
+
+def pick_image_to_base64(parent=None):
+    
+    filters = "Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.webp)"
+    path, _ = QtWidgets.QFileDialog.getOpenFileName(parent, "Choose Image", "", filters)
+    if not path:
+        return "", ""
+    with open(path, "rb") as f:
+        b64 = base64.b64encode(normalize_thumbnail(f.read())).decode("utf-8")
+    return b64, path
@@ -0,0 +1,529 @@
+
+import os, re, json, gzip, uuid, base64, hashlib, shutil, tempfile, threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+try:
+    from . import MaliProfile as mp  # type: ignore
+except Exception:
+    import MaliProfile as mp
+try:
+    from . import MaliCodec as mc  # type: ignore
+except Exception:
+    import MaliCodec as mc
+
+
+_HASH_CHUNK = 1 << 20
+_IO_WORKERS = min(4, os.cpu_count() or 2)
+_IO_POOL = None
+_IO_POOL_LOCK = threading.Lock()
+
+
+def io_pool():
+    # bounded pool for texture / body file I/O; never runs maya.cmds
+    global _IO_POOL
+    with _IO_POOL_LOCK:
+        if _IO_POOL is None:
+            _IO_POOL = ThreadPoolExecutor(max_workers=_IO_WORKERS, thread_name_prefix="MLI_IO")
+        return _IO_POOL
+
+
+# Optional compression, chosen by the library file's extension: lib.json.gz /
+# lib.json.zst. The index and every body of such a library are compressed;
+# blobs (images) are stored as they are.
+
+COMPRESSIONS = (".gz", ".zst")
+_GZ_LEVEL, _ZST_LEVEL = 6, 3
+
+
+def compression_of(path):
+    ext = os.path.splitext(path or "")[1].lower()
+    return ext if ext in COMPRESSIONS else ""
+
+
+def available_compressions():
+    return [c for c in COMPRESSIONS if c != ".zst" or zstandard is not None]
+
+
+def _require(comp):
+    if comp == ".zst" and zstandard is None:
+        raise RuntimeError("Reading or writing .zst libraries needs the 'zstandard' Python module.")
+
+
+def open_read(path):
+    # binary file object yielding the decompressed content as it is read
+    comp = compression_of(path)
+    _require(comp)
+    if comp == ".gz":
+        return gzip.open(path, "rb")
+    if comp == ".zst":
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+# Sidecar layout (next to the library JSON); lib.json -> lib_data, lib.json.gz -> lib_gz_data
+
+def sidecar_dir(lib_path):
+    comp = compression_of(lib_path)
+    base = os.path.splitext(lib_path[:len(lib_path) - len(comp)])[0]
+    return base + ("_%s_data" % comp[1:] if comp else "_data")
+
+
+def blob_dir_for(lib_path):
+    return os.path.join(sidecar_dir(lib_path), "blobs")
+
+
+def body_dir_for(lib_path):
+    return os.path.join(sidecar_dir(lib_path), "bodies")
+
+
+def new_material_id():
+    return uuid.uuid4().hex
+
+
+# Blob keys and material ids come from library files and become file names;
+# anything else (a shared or hand-edited library with "../..") is rejected.
+_BLOB_KEY_RE = re.compile(r"[0-9a-f]{40}(\.\w+)?\Z", re.ASCII)
+_MAT_ID_RE   = re.compile(r"[A-Za-z0-9_-]{1,64}\Z", re.ASCII)
+
+
+def valid_blob_key(key):
+    return isinstance(key, str) and _BLOB_KEY_RE.match(key) is not None
+
+
+def valid_material_id(mat_id):
+    return isinstance(mat_id, str) and _MAT_ID_RE.match(mat_id) is not None
+
+
+@contextmanager
+def _atomic_stream(path, comp=""):
+    # binary writer compressing into a temp file; replaces path on success
+    _require(comp)
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            if comp == ".gz":
+                out = gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=_GZ_LEVEL, mtime=0)
+            elif comp == ".zst":
+                out = zstandard.ZstdCompressor(level=_ZST_LEVEL).stream_writer(raw, closefd=False)
+            else:
+                out = raw
+            yield out
+            if out is not raw: out.close()
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except Exception: pass
+        raise
+
+
+def _atomic_write(path, data: bytes, comp=""):
+    with _atomic_stream(path, comp) as f:
+        f.write(data)
+
+
+def _atomic_copy(src, dst):
+    folder = os.path.dirname(dst)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except Exception:
+        try: os.remove(tmp)
+        except Exception: pass
+        raise
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _ext_of(name):
+    return os.path.splitext(name or "")[1].lower()
+
+
+def blob_key(data: bytes, ext=""):
+    return hashlib.sha1(data).hexdigest() + (ext or "").lower()
+
+
+def thumb_key(data: bytes):
+    # the key a thumbnail's bytes are stored under (LibraryStore._write_body)
+    return blob_key(data, _image_ext(data))
+
+
+def _image_ext(data: bytes):
+    if data[:8] == b"\x89PNG\r\n\x1a\n": return ".png"
+    if data[:3] == b"\xff\xd8\xff":         return ".jpg"
+    if data[:2] == b"BM":                   return ".bmp"
+    if data[:4] in (b"II*\x00", b"MM\x00*"): return ".tif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP": return ".webp"
+    return ""
+
+
+# Content-addressed blob store
+
+class BlobStore(object):
+    SOURCES_FILE = "sources.json"
+
+    def __init__(self, root):
+        self.root = root
+        self._sources = None          # abs source path -> [size, mtime_ns, key]
+        self._sources_dirty = False
+        self._lock = threading.Lock()
+
+    def key_path(self, key):
+        if not valid_blob_key(key):
+            raise ValueError("invalid blob key: %r" % (key,))
+        return os.path.join(self.root, key[:2], key)
+
+    def has(self, key):
+        return valid_blob_key(key) and os.path.isfile(self.key_path(key))
+
+    def read(self, key):
+        with open(self.key_path(key), "rb") as f:
+            return f.read()
+
+    def put_bytes(self, data: bytes, ext=""):
+        key = blob_key(data, ext)
+        if not self.has(key):
+            _atomic_write(self.key_path(key), data)
+        return key
+
+    def put_file(self, path):
+        src = os.path.abspath(path)
+        st = os.stat(src)
+        known = self._source_cache().get(src)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns and self.has(known[2]):
+            return known[2]
+        key = file_digest(src) + _ext_of(src)
+        if not self.has(key):
+            _atomic_copy(src, self.key_path(key))
+        with self._lock:
+            self._sources[src] = [st.st_size, st.st_mtime_ns, key]
+            self._sources_dirty = True
+        return key
+
+    def source_changed(self, path):
+        # True when path no longer matches the size / mtime it was hashed at here
+        # (or never was); a missing file counts as unchanged
+        src = os.path.abspath(path)
+        try: st = os.stat(src)
+        except OSError: return False
+        known = self._source_cache().get(src)
+        return not known or known[0] != st.st_size or known[1] != st.st_mtime_ns
+
+    def _source_cache(self):
+        with self._lock:
+            return self._source_cache_unlocked()
+
+    def _source_cache_unlocked(self):
+        if self._sources is None:
+            self._sources = {}
+            try:
+                with open(os.path.join(self.root, self.SOURCES_FILE), "r", encoding="utf-8") as f:
+                    self._sources = json.load(f) or {}
+            except Exception:
+                pass
+        return self._sources
+
+    def prune(self, keep):
+        # delete every blob whose key is not in keep; returns bytes freed
+        freed = 0
+        for sub in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            folder = os.path.join(self.root, sub)
+            if not os.path.isdir(folder): continue
+            for key in os.listdir(folder):
+                if key in keep or key.endswith(".tmp"): continue
+                try:
+                    fp = os.path.join(folder, key); size = os.path.getsize(fp)
+                    os.remove(fp); freed += size
+                except Exception:
+                    pass
+            try: os.rmdir(folder)        # only succeeds once empty
+            except OSError: pass
+        with self._lock:
+            src = self._source_cache_unlocked()
+            for k in [k for k, v in src.items() if v[2] not in keep]:
+                src.pop(k); self._sources_dirty = True
+        return freed
+
+    def flush(self):
+        with self._lock:
+            if not self._sources_dirty:
+                return
+            data = json.dumps(self._sources, ensure_ascii=False).encode("utf-8")
+            self._sources_dirty = False
+        _atomic_write(os.path.join(self.root, self.SOURCES_FILE), data)
+
+
+# Graph embeds <-> blob references
+
+def externalize_embed(emb: dict, store: BlobStore, fallbacks=()):
+    key = emb.get("blob")
+    if key and store.has(key):
+        emb.pop("b64", None)
+        return key
+    if key:
+        for fb in fallbacks:
+            if fb is not store and fb.has(key):
+                _atomic_copy(fb.key_path(key), store.key_path(key))
+                emb.pop("b64", None)
+                return key
+    key = None
+    if emb.get("b64"):
+        key = store.put_bytes(base64.b64decode(emb["b64"]), _ext_of(emb.get("name") or emb.get("path")))
+    elif emb.get("path") and os.path.isfile(emb["path"]):
+        key = store.put_file(emb["path"])
+    if key:
+        emb["blob"] = key
+        emb.pop("b64", None)
+    return key
+
+
+def externalize_graph_embeds(graph: dict, store: BlobStore, fallbacks=()):
+    for spec in ((graph or {}).get("nodes") or {}).values():
+        emb = spec.get("embed")
+        if not emb:
+            continue
+        try:
+            externalize_embed(emb, store, fallbacks)
+        except Exception:
+            pass
+
+
+# Segmented library: small JSON index + one compact JSON body per material.
+# Loading reads only the index; graph bodies and thumbnail blobs are read
+# when something asks for them.
+
+LIB_FORMAT  = "mli-lib"
+LIB_VERSION = 3
+PACKED_EXT  = ".mlg"        # MaliCodec body of a version 3 library: still read, replaced when rewritten
+
+_INDEX_KEYS = ("id", "name", "assets", "thumb", "terms", "ghash")
+
+
+def is_library_index(data):
+    return isinstance(data, dict) and data.get("format") == LIB_FORMAT
+
+
+def _dump_compact(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _write_index(f, index, chunk=256):
+    # {"format", "version", "folders": {...}} streamed into f a few hundred
+    # entries at a time, so neither the text nor the compressor input is whole
+    enc = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    head = {k: v for k, v in index.items() if k != "folders"}
+    f.write((enc(head)[:-1] + ("," if head else "") + '"folders":{').encode("utf-8"))
+    for n, (folder, entries) in enumerate(index.get("folders", {}).items()):
+        f.write((("," if n else "") + enc(folder) + ":[").encode("utf-8"))
+        for i in range(0, len(entries), chunk):
+            f.write((("," if i else "") + enc(entries[i:i + chunk])[1:-1]).encode("utf-8"))
+        f.write(b"]")
+    f.write(b"}}")
+
+
+def _strip_blob_refs(graph):
+    nodes = {}
+    for n, spec in ((graph or {}).get("nodes") or {}).items():
+        if spec.get("embed"):
+            spec = dict(spec, embed={k: v for k, v in spec["embed"].items() if k not in ("blob", "b64")})
+        nodes[n] = spec
+    return dict(graph or {}, nodes=nodes)
+
+
+def graph_terms(graph):
+    # searchable words of a network kept in the index: node types + texture file names
+    terms = set()
+    for spec in ((graph or {}).get("nodes") or {}).values():
+        if spec.get("type"): terms.add(spec["type"])
+        emb = spec.get("embed") or {}
+        name = emb.get("name") or os.path.basename((emb.get("path") or "").replace("\\", "/"))
+        if name: terms.add(name)
+    return sorted(terms)
+
+
+def embed_paths(graph):
+    # texture files a network was captured from
+    return [emb["path"] for emb in (spec.get("embed") or {} for spec in ((graph or {}).get("nodes") or {}).values())
+            if emb.get("path")]
+
+
+def graph_hash(graph):
+    # kept in the index so a scene network can be checked without reading its body
+    text = json.dumps(_strip_blob_refs(graph), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def same_graph(a, b):
+    return _strip_blob_refs(a) == _strip_blob_refs(b)
+
+
+def load_graph(m: dict, stores):
+    if "graph" in m:
+        return m["graph"] or {}
+    for st in stores:
+        if st.has_body(m.get("id")):
+            try: return st.load_body(m["id"]).get("graph") or {}
+            except Exception: pass
+    return {}
+
+
+def load_thumb_bytes(m: dict, stores):
+    key = m.get("thumb")
+    for st in stores:
+        if st.blobs.has(key):
+            try: return st.blobs.read(key)
+            except Exception: pass
+    return b""
+
+
+class LibraryStore(object):
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.blobs = BlobStore(blob_dir_for(self.path))
+        self.body_dir = body_dir_for(self.path)
+        self.comp = compression_of(self.path)     # bodies follow the index
+        self.legacy = False           # last load() read a single-file (pre-index) library
+
+    def _body_file(self, mat_id, ext):
+        if not valid_material_id(mat_id):
+            raise ValueError("invalid material id: %r" % (mat_id,))
+        return os.path.join(self.body_dir, mat_id + ext + self.comp)
+
+    def body_path(self, mat_id):
+        return self._body_file(mat_id, ".json")
+
+    def _packed_body_path(self, mat_id):
+        return self._body_file(mat_id, PACKED_EXT)
+
+    def has_body(self, mat_id):
+        return valid_material_id(mat_id) and (os.path.isfile(self.body_path(mat_id)) or os.path.isfile(self._packed_body_path(mat_id)))
+
+    @mp.timed("store.load_body")
+    def load_body(self, mat_id):
+        try:
+            with open_read(self.body_path(mat_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        with open_read(self._packed_body_path(mat_id)) as f:
+            return {"graph": mc.decode_graph(f.read())}
+
+    @mp.timed("store.load")
+    def load(self):
+        with open_read(self.path) as f:
+            data = json.load(f)
+        self.legacy = not is_library_index(data)
+        if self.legacy:
+            for mats in (data or {}).values():
+                for m in mats if isinstance(mats, list) else ():
+                    if isinstance(m, dict) and m.get("id") and not valid_material_id(m["id"]):
+                        m["id"] = new_material_id()
+            return data or {}
+
+        lib = {}
+        for folder, entries in (data.get("folders") or {}).items():
+            mats = lib.setdefault(folder, [])
+            for e in entries:
+                # an unsafe id gets a fresh one (its body can't be located); an unsafe key is dropped
+                mid = e.get("id") if valid_material_id(e.get("id")) else new_material_id()
+                m = {"id": mid, "name": e.get("name", ""),
+                     "assets": list(e.get("assets") or []), "thumb_b64": ""}
+                if valid_blob_key(e.get("thumb")):
+                    m["thumb"] = e["thumb"]
+                if e.get("ghash"):
+                    m["ghash"] = e["ghash"]
+                if e.get("terms") is not None:
+                    m["terms"] = list(e["terms"])
+                mats.append(m)
+        return lib
+
+    @mp.timed("store.write_body")
+    def _write_body(self, m, sources):
+        b64 = m.get("thumb_b64") or ""
+        key = m.get("thumb")
+        if b64:
+            raw = base64.b64decode(b64)
+            m["thumb"] = self.blobs.put_bytes(raw, _image_ext(raw))      # == thumb_key(raw)
+            m["thumb_b64"] = ""         # the blob is the copy from now on
+        elif key and not self.blobs.has(key):
+            src = next((st.blobs for st in sources if st.blobs.has(key)), None)
+            if src: _atomic_copy(src.key_path(key), self.blobs.key_path(key))
+            else:   m.pop("thumb", None)
+        graph = load_graph(m, [self] + list(sources))
+        if graph:
+            externalize_graph_embeds(graph, self.blobs, [st.blobs for st in sources])
+        m["terms"] = graph_terms(graph)
+        m["ghash"] = graph_hash(graph)
+        _atomic_write(self.body_path(m["id"]), _dump_compact({"graph": graph}), self.comp)
+        try: os.remove(self._packed_body_path(m["id"]))
+        except OSError: pass
+
+    def submit_body(self, m, sources=()):
+        return io_pool().submit(self._write_body, m, list(sources))
+
+    def referenced_blobs(self, lib_data):
+        keep = set()
+        for mats in lib_data.values():
+            for m in mats:
+                if m.get("thumb"): keep.add(m["thumb"])
+                graph = self.load_body(m["id"]).get("graph") or {}     # unreadable body: raise, prune nothing
+                for spec in (graph.get("nodes") or {}).values():
+                    if (spec.get("embed") or {}).get("blob"): keep.add(spec["embed"]["blob"])
+        return keep
+
+    @mp.timed("store.save")
+    def save(self, lib_data, dirty_ids=(), sources=(), pending=None, prune_blobs=False):
+        # pending: material id -> future from submit_body() started while capturing
+        # prune_blobs: also delete blobs no material references any more (reads every body)
+        os.makedirs(self.body_dir, exist_ok=True)
+        pending, live = dict(pending or {}), set()
+        for mats in lib_data.values():
+            for m in mats:
+                if not valid_material_id(m.get("id")): m["id"] = new_material_id()
+                mid = m["id"]
+                live.add(mid)
+                if mid not in pending and (mid in dirty_ids or not self.has_body(mid)):
+                    pending[mid] = self.submit_body(m, sources)
+        errors = [e for e in (fut.exception() for fut in pending.values()) if e]
+        if errors:
+            raise errors[0]
+
+        folders = {}
+        for folder, mats in lib_data.items():
+            folders[folder] = [{k: m[k] for k in _INDEX_KEYS if m.get(k) is not None} for m in mats]
+
+        index = {"format": LIB_FORMAT, "version": LIB_VERSION, "folders": folders}
+        with _atomic_stream(self.path, self.comp) as f:
+            _write_index(f, index)
+        self.legacy = False
+
+        # only once the new index is in place: a failed write above leaves the
+        # old index with every body it points at
+        for fn in os.listdir(self.body_dir):
+            if not fn.endswith(self.comp): continue
+            stem, ext = os.path.splitext(fn[:len(fn) - len(self.comp)])
+            if ext in (".json", PACKED_EXT) and stem not in live:
+                try: os.remove(os.path.join(self.body_dir, fn))
+                except Exception: pass
+
+        if prune_blobs:
+            try: self.blobs.prune(self.referenced_blobs(lib_data))
+            except Exception: pass
+        self.blobs.flush()
@@ -7,7 +7,7 @@ except Exception:
     from PySide2 import QtCore, QtGui, QtWidgets
     from shiboken2 import wrapInstance
 
-import os, sys, json, re
+import os, sys, json, re, base64, queue, threading
 
 import maya.OpenMayaUI as omui
 try:
@@ -23,6 +23,23 @@ try:
     from . import MaliUtil as mu   # type: ignore
 except Exception:
     import MaliUtil as mu
+try:
+    from . import MaliQt as mq     # type: ignore
+except Exception:
+    import MaliQt as mq
+try:
+    from . import MaliStore as ms  # type: ignore
+except Exception:
+    import MaliStore as ms
+try:
+    from . import MaliIndex as mi  # type: ignore
+except Exception:
+    import MaliIndex as mi
+try:
+    from . import MaliProfile as mp  # type: ignore
+except Exception:
+    import MaliProfile as mp
+mp.watch_cmds(__name__)
 
 
 THEME = {
@@ -144,13 +161,13 @@ def build_stylesheet(t=THEME) -> str:
         border: 1px solid {t['focus_ring']};
     }}
 
-    QTreeWidget, QListWidget, QTableView, QScrollArea {{
+    QTreeView, QListView, QTableView, QScrollArea {{
         background: {t['field_bg']};
         color: {t['field_fg']};
         border: 1px solid {t['border']};
         border-radius: {r}px;
     }}
-    QTreeWidget::item:selected, QListWidget::item:selected {{
+    QTreeView::item:selected, QListView::item:selected {{
         background: {t['field_sel']};
         color: {t['field_sel_fg']};
     }}
@@ -183,6 +200,14 @@ def apply_theme(widget: QtWidgets.QWidget):
     widget.setStyleSheet(build_stylesheet(THEME))
 
 
+def _qcolor(css: str) -> QtGui.QColor:
+    m = re.match(r"rgba\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*([\d.]+)\s*\)", css or "")
+    if not m:
+        return QtGui.QColor(css)
+    c = QtGui.QColor(int(m.group(1)), int(m.group(2)), int(m.group(3))); c.setAlphaF(float(m.group(4)))
+    return c
+
+
 # Constants / sizing
 
 DEFAULT_SIZE    = QtCore.QSize(780, 500)
@@ -190,6 +215,8 @@ LEFT_PANEL_W    = 100
 TREE_ICON_SIZE  = QtCore.QSize(28, 28)
 PREVIEW_W       = 150
 PREVIEW_H       = 150
+PREVIEW_SIZE    = QtCore.QSize(PREVIEW_W, PREVIEW_H)
+CARD_H          = 400
 
 # JSON path policy (per-scene)
 
@@ -204,20 +231,14 @@ def _scene_json_path():
     return os.path.join(folder, "material_library.json")
 
 # ---- fallback icon ----
-def _qicon_from_b64(b64str: str) -> QtGui.QIcon:
-    if hasattr(mu, "qicon_from_b64"):
-        try:
-            return mu.qicon_from_b64(b64str)
-        except Exception:
-            pass
-    if not b64str:
-        return QtGui.QIcon()
-    try:
-        ba = QtCore.QByteArray.fromBase64(QtCore.QByteArray(b64str.encode('utf-8')))
-        pm = QtGui.QPixmap(); pm.loadFromData(ba)
-        return QtGui.QIcon(pm) if not pm.isNull() else QtGui.QIcon()
-    except Exception:
-        return QtGui.QIcon()
+def _library_filters(save=False):
+    # file dialog filters; compressed libraries are picked by extension (MaliStore.compression_of)
+    comps = ms.available_compressions()
+    if not save:
+        return "Material Library (%s)" % " ".join(["*.json"] + ["*.json" + c for c in comps])
+    names = {".gz": "gzip", ".zst": "zstd"}
+    return ";;".join(["Material Library (*.json)"] +
+                     ["Compressed Library, %s (*.json%s)" % (names[c], c) for c in comps])
 
 
 # Dialog: Add Material
@@ -249,8 +270,8 @@ class MaterialPropDialog(QtWidgets.QDialog):
         form.addRow("Name:", self.name_le)
         main.addLayout(form)
 
-        if hasattr(mu, "ImagePreview"):
-            self.preview = mu.ImagePreview(200, 200, self)
+        if hasattr(mq, "ImagePreview"):
+            self.preview = mq.ImagePreview(200, 200, self)
             self.preview.set_image_b64(self.data.get("thumb_b64", ""))
         else:
             self.preview = QtWidgets.QLabel("No Preview")
@@ -278,8 +299,8 @@ class MaterialPropDialog(QtWidgets.QDialog):
 
     def _pick_image(self):
         b64 = ""
-        if hasattr(mu, "pick_image_to_base64"):
-            b64, _ = mu.pick_image_to_base64(self)
+        if hasattr(mq, "pick_image_to_base64"):
+            b64, _ = mq.pick_image_to_base64(self)
         if not b64:
             return
         self.data["thumb_b64"] = b64
@@ -294,6 +315,74 @@ class MaterialPropDialog(QtWidgets.QDialog):
         }
 
 
+# Diagnostics: MaliProfile spans and maya.cmds counts
+class DiagnosticsDialog(QtWidgets.QDialog):
+    COLUMNS = ("Span", "Calls", "Total ms", "Avg ms", "Max ms")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+        self.resize(620, 420)
+
+        main = QtWidgets.QVBoxLayout(self)
+        main.setContentsMargins(8, 8, 8, 8)
+        main.setSpacing(6)
+
+        self.chk_enabled = QtWidgets.QCheckBox("Record timings")
+        self.chk_enabled.setChecked(mp.enabled)
+        self.chk_enabled.setToolTip("Time library hot paths and count maya.cmds calls while checked.")
+        main.addWidget(self.chk_enabled)
+
+        self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        main.addWidget(self.table, 1)
+
+        btns = QtWidgets.QHBoxLayout()
+        refresh_btn = QtWidgets.QPushButton("Refresh")
+        reset_btn   = QtWidgets.QPushButton("Reset")
+        export_btn  = QtWidgets.QPushButton("Export...")
+        close_btn   = QtWidgets.QPushButton("Close")
+        btns.addWidget(refresh_btn); btns.addWidget(reset_btn); btns.addStretch(1)
+        btns.addWidget(export_btn); btns.addWidget(close_btn)
+        main.addLayout(btns)
+
+        self.chk_enabled.toggled.connect(mp.set_enabled)
+        refresh_btn.clicked.connect(self.refresh)
+        reset_btn.clicked.connect(lambda: (mp.reset(), self.refresh()))
+        export_btn.clicked.connect(self._export)
+        close_btn.clicked.connect(self.close)
+
+        apply_theme(self)
+        self.refresh()
+
+    def refresh(self):
+        rows = mp.rows()
+        self.table.setRowCount(len(rows))
+        for r, (name, n, tot, avg, mx) in enumerate(rows):
+            cells = (name, str(n), "%.2f" % (tot * 1e3), "%.3f" % (avg * 1e3), "%.3f" % (mx * 1e3))
+            for c, text in enumerate(cells):
+                it = QtWidgets.QTableWidgetItem(text)
+                if c: it.setTextAlignment(int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter))
+                self.table.setItem(r, c, it)
+
+    def _export(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export Diagnostics", "mli_profile.json",
+                                                        "JSON (*.json);;Text (*.txt)")
+        if not path: return
+        try:
+            mp.export(path)
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self, "Export", "Could not write report:\n%s" % e)
+
+    def showEvent(self, e):
+        self.refresh()
+        super().showEvent(e)
+
+
 # Material Card
 class MaterialCard(QtWidgets.QFrame):
     nameEditedLive = QtCore.Signal(object, str)
@@ -302,11 +391,13 @@ class MaterialCard(QtWidgets.QFrame):
     requestSelect  = QtCore.Signal(object)
     requestLink    = QtCore.Signal(object)
     thumbChanged   = QtCore.Signal(object)
+    assetsChanged  = QtCore.Signal(object)
 
-    def __init__(self, mat_ref: dict, parent=None):
+    def __init__(self, mat_ref: dict, parent=None, thumb_source=None):
         super().__init__(parent)
         self.setObjectName("Card_Material")
         self.mat = mat_ref
+        self._thumb_source = thumb_source or (lambda m: m.get("thumb_b64",""))
         self.mat.setdefault("assets", [])
         self.setFrameShape(QtWidgets.QFrame.StyledPanel)
 
@@ -315,9 +406,9 @@ class MaterialCard(QtWidgets.QFrame):
 
         top = QtWidgets.QHBoxLayout()
 
-        if hasattr(mu, "ImagePreview"):
-            self.preview = mu.ImagePreview(PREVIEW_W, PREVIEW_H, self)
-            self.preview.set_image_b64(self.mat.get("thumb_b64",""))
+        if hasattr(mq, "ImagePreview"):
+            self.preview = mq.ImagePreview(PREVIEW_W, PREVIEW_H, self)
+            self._show_thumb()
         else:
             self.preview = QtWidgets.QLabel("No Preview")
             self.preview.setObjectName("PreviewFallback")
@@ -390,7 +481,7 @@ class MaterialCard(QtWidgets.QFrame):
 
     def _pick_image(self):
         b64 = ""
-        if hasattr(mu, "pick_image_to_base64"): b64, _ = mu.pick_image_to_base64(self)
+        if hasattr(mq, "pick_image_to_base64"): b64, _ = mq.pick_image_to_base64(self)
         if not b64: return
         self.mat["thumb_b64"] = b64
         if hasattr(self.preview, "set_image_b64"): self.preview.set_image_b64(b64)
@@ -403,6 +494,7 @@ class MaterialCard(QtWidgets.QFrame):
         self._unassign_from_scene(names)
         self.mat["assets"] = [n for n in self.mat.get("assets", []) if n not in set(names)]
         self._populate_assets()
+        self.assetsChanged.emit(self.mat)
 
     def _unassign_from_scene(self, names):
         if not cmds: return
@@ -443,15 +535,430 @@ class MaterialCard(QtWidgets.QFrame):
     def set_name(self, new_name):
         self.name_le.blockSignals(True); self.name_le.setText(new_name); self.name_le.blockSignals(False)
 
+    def _show_thumb(self):
+        # thumb_source may hand back a decoded QPixmap, base64 text or None (still loading)
+        src = self._thumb_source(self.mat)
+        if (src is None or isinstance(src, QtGui.QPixmap)) and hasattr(self.preview, "set_pixmap"):
+            self.preview.set_pixmap(src)
+        elif hasattr(self.preview, "set_image_b64"):
+            self.preview.set_image_b64(src if isinstance(src, str) else "")
+
     def refresh(self):
-        if hasattr(self.preview, "set_image_b64"):
-            self.preview.set_image_b64(self.mat.get("thumb_b64",""))
+        self._show_thumb()
         self._populate_assets()
 
 
+# Card view: a list model of material dicts painted by a delegate. Only the
+# hovered / focused row gets a real MaterialCard (as a persistent editor).
+
+class MaterialCardModel(QtCore.QAbstractListModel):
+    MAT_ROLE = QtCore.Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._mats, self._rows = [], {}
+
+    def set_materials(self, mats):
+        self.beginResetModel()
+        self._mats = list(mats)
+        self._rows = {m.get("id"): i for i, m in enumerate(self._mats)}
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._mats)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._mats):
+            return None
+        m = self._mats[index.row()]
+        if role == QtCore.Qt.DisplayRole: return m.get("name","")
+        if role == self.MAT_ROLE:         return m
+        return None
+
+    def sync_materials(self, mats):
+        # row-level update to mats (same relative order as the current rows):
+        # rows that stay keep their open editor, nothing is reset
+        keep = {m.get("id") for m in mats}
+        root, row = QtCore.QModelIndex(), len(self._mats) - 1
+        while row >= 0:
+            if self._mats[row].get("id") in keep:
+                row -= 1; continue
+            end = row
+            while row > 0 and self._mats[row - 1].get("id") not in keep: row -= 1
+            self.beginRemoveRows(root, row, end); del self._mats[row:end + 1]; self.endRemoveRows()
+            row -= 1
+        have = {m.get("id") for m in self._mats}
+        if [m.get("id") for m in self._mats] != [m.get("id") for m in mats if m.get("id") in have]:
+            self.set_materials(mats); return
+        i = 0
+        while i < len(mats):
+            if i < len(self._mats) and self._mats[i].get("id") == mats[i].get("id"):
+                i += 1; continue
+            nxt = self._mats[i].get("id") if i < len(self._mats) else None
+            j = i
+            while j < len(mats) and mats[j].get("id") != nxt: j += 1
+            self.beginInsertRows(root, i, j - 1); self._mats[i:i] = mats[i:j]; self.endInsertRows()
+            i = j
+        self._rows = {m.get("id"): i for i, m in enumerate(self._mats)}
+
+    def index_of(self, mat_id):
+        row = self._rows.get(mat_id)
+        return self.index(row) if row is not None else QtCore.QModelIndex()
+
+    def material_changed(self, m):
+        idx = self.index_of(m.get("id"))
+        if idx.isValid(): self.dataChanged.emit(idx, idx)
+
+
+class MaterialCardDelegate(QtWidgets.QStyledItemDelegate):
+    PAD, GAP, ROW_H = 12, 10, 28
+
+    def __init__(self, owner, parent=None):
+        super().__init__(parent)
+        self.owner = owner
+
+    def sizeHint(self, option, index):
+        view = self.parent()
+        w = view.viewport().width() - 2 * view.spacing() if view else 400
+        return QtCore.QSize(max(300, w), CARD_H)
+
+    def createEditor(self, parent, option, index):
+        return self.owner._make_card(index.data(MaterialCardModel.MAT_ROLE), parent)
+
+    def setEditorData(self, editor, index):
+        pass        # the card edits its material dict directly
+
+    def setModelData(self, editor, model, index):
+        pass
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
+
+    def destroyEditor(self, editor, index):
+        self.owner._forget_card(editor)
+        super().destroyEditor(editor, index)
+
+    def _box(self, p, rect, text, radius, align=QtCore.Qt.AlignCenter):
+        t = THEME
+        path = QtGui.QPainterPath(); path.addRoundedRect(QtCore.QRectF(rect), radius, radius)
+        p.fillPath(path, _qcolor(t["btn_bg"])); p.setPen(_qcolor(t["btn_border"])); p.drawPath(path)
+        p.setPen(QtGui.QColor(t["btn_fg"]))
+        p.drawText(rect.adjusted(8, 0, -8, 0), align | QtCore.Qt.AlignVCenter, text)
+
+    def paint(self, p, option, index):
+        view = self.parent()
+        if view is not None and view.indexWidget(index) is not None:
+            return      # a live card covers this row
+        m = index.data(MaterialCardModel.MAT_ROLE) or {}
+        t, P, G, H = THEME, self.PAD, self.GAP, self.ROW_H
+        r = option.rect.adjusted(0, 0, -1, -1)
+        p.save(); p.setRenderHint(QtGui.QPainter.Antialiasing, True)
+        card = QtGui.QPainterPath(); card.addRoundedRect(QtCore.QRectF(r), t["round"], t["round"])
+        p.fillPath(card, _qcolor(t["panel_bg"])); p.setPen(_qcolor(t["border"])); p.drawPath(card)
+
+        x, y = r.x() + P, r.y() + P
+        pm = self.owner._thumb_pixmap(m)
+        mq.paint_preview(p, QtCore.QRect(x, y, PREVIEW_W, PREVIEW_H), pm, text="" if pm is None else "No Preview")
+
+        rx = x + PREVIEW_W + G; rw = r.right() - P - rx; fm = p.fontMetrics()
+        lw = fm.horizontalAdvance("Name :") if hasattr(fm, "horizontalAdvance") else fm.width("Name :")
+        p.setPen(QtGui.QColor(t["text"]))
+        p.drawText(QtCore.QRect(rx, y, lw, H + 4), QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter, "Name :")
+        self._box(p, QtCore.QRect(rx + lw + 6, y, rw - lw - 6, H + 4), m.get("name",""), t["round"], QtCore.Qt.AlignLeft)
+        bw = (rw - 6) // 2
+        for row, labels in enumerate((("Edit Material", "Link Material"), ("Edit Image", "Select All"))):
+            by = y + H + 4 + G + row * (H + G)
+            for col, label in enumerate(labels):
+                self._box(p, QtCore.QRect(rx + col * (bw + 6), by, bw, H), label, t["btn_round"])
+
+        y += PREVIEW_H + G
+        p.setPen(_qcolor(t["border"])); p.drawLine(x, y, r.right() - P, y)
+        y += G
+        p.setPen(QtGui.QColor(t["header_fg"]))
+        bold = QtGui.QFont(p.font()); bold.setWeight(QtGui.QFont.DemiBold)
+        p.save(); p.setFont(bold)
+        p.drawText(QtCore.QRect(x, y, rw, H), QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter, "Asset Used")
+        p.restore()
+        self._box(p, QtCore.QRect(r.right() - P - 80, y, 80, H), "Remove", t["btn_round"])
+        y += H + G
+
+        lst = QtCore.QRect(x, y, r.right() - P - x, r.bottom() - P - G - y)
+        path = QtGui.QPainterPath(); path.addRoundedRect(QtCore.QRectF(lst), t["round"], t["round"])
+        p.fillPath(path, _qcolor(t["field_bg"])); p.setPen(_qcolor(t["border"])); p.drawPath(path)
+        p.setPen(QtGui.QColor(t["field_fg"]))
+        lh = fm.height() + 4; ly = lst.y() + 4
+        for name in m.get("assets", []) or []:
+            if ly + lh > lst.bottom(): break
+            p.drawText(QtCore.QRect(lst.x() + 8, ly, lst.width() - 16, lh), QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter, name)
+            ly += lh
+        p.restore()
+
+
+class MaterialCardView(QtWidgets.QListView):
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setUniformItemSizes(True)
+        self.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.setResizeMode(QtWidgets.QListView.Adjust)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.setSpacing(8)
+        self.setMouseTracking(True)
+        self._open = []             # QPersistentModelIndex of rows showing a real card
+        self.entered.connect(self.open_card)
+
+    def setModel(self, model):
+        super().setModel(model)
+        model.modelAboutToBeReset.connect(lambda: setattr(self, "_open", []))
+
+    def open_card(self, index):
+        # keep at most the requested row plus the card holding keyboard focus
+        if not index.isValid(): return None
+        fw = QtWidgets.QApplication.focusWidget()
+        keep = []
+        for pi in self._open:
+            ed = self.indexWidget(QtCore.QModelIndex(pi)) if pi.isValid() else None
+            if pi == QtCore.QPersistentModelIndex(index) or (ed and fw and ed.isAncestorOf(fw)):
+                keep.append(pi)
+            elif pi.isValid():
+                self.closePersistentEditor(QtCore.QModelIndex(pi))
+        self._open = keep
+        if all(pi != QtCore.QPersistentModelIndex(index) for pi in keep):
+            self.openPersistentEditor(index)
+            self._open.append(QtCore.QPersistentModelIndex(index))
+        return self.indexWidget(index)
+
+
 # MaterialTree (Drag & Drop controller)
 
-class MaterialTree(QtWidgets.QTreeWidget):
+class _TreeNode(object):
+    __slots__ = ("kind", "name")
+
+    def __init__(self, kind, name=""):
+        self.kind, self.name = kind, name
+
+
+class LibraryTreeModel(QtCore.QAbstractItemModel):
+    # "All Material" > folders > materials, read straight from owner.lib_data.
+    # Every edit goes through the methods below so the view gets row-level
+    # signals instead of a rebuild. An index's internal pointer is its parent
+    # node: a material row is lib_data[pointer.name][row].
+    KIND_ROLE   = QtCore.Qt.UserRole
+    MAT_ID_ROLE = QtCore.Qt.UserRole + 1
+    KIND_ROOT, KIND_FOLDER, KIND_MAT = "root", "folder", "material"
+
+    def __init__(self, owner, parent=None):
+        super().__init__(parent)
+        self.owner = owner
+        self._top  = _TreeNode(None)
+        self._root = _TreeNode(self.KIND_ROOT, "All Material")
+        self._folders, self._frow, self._fnodes = [], {}, {}
+        self._live_names = {}       # material id -> name being typed on a card
+        self._mrow = {}             # material id -> row in its folder list (material_index in O(1))
+
+    @property
+    def lib(self):
+        return self.owner.lib_data
+
+    @property
+    def idx(self):
+        return self.owner.lib_index
+
+    def _sync_folders(self):
+        self._folders = list(self.lib.keys())
+        self._frow = {f: i for i, f in enumerate(self._folders)}
+        self._fnodes = {f: self._fnodes.get(f) or _TreeNode(self.KIND_FOLDER, f) for f in self._folders}
+
+    # ---- Qt model interface ----
+    def _node(self, index):
+        # own node of a root/folder index, None for a material row
+        if not index.isValid(): return self._top
+        p = index.internalPointer()
+        if p is self._top:  return self._root
+        if p is self._root: return self._fnodes.get(self._folders[index.row()]) if index.row() < len(self._folders) else None
+        return None
+
+    def index(self, row, column=0, parent=QtCore.QModelIndex()):
+        node = self._node(parent)
+        if column != 0 or node is None or row < 0 or row >= self._count(node):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, 0, node)
+
+    def parent(self, index=QtCore.QModelIndex()):
+        if not index.isValid(): return QtCore.QModelIndex()
+        p = index.internalPointer()
+        if p is self._top:  return QtCore.QModelIndex()
+        if p is self._root: return self.createIndex(0, 0, self._top)
+        return self.createIndex(self._frow.get(p.name, 0), 0, self._root)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return self._count(self._node(parent))
+
+    def _count(self, node):
+        if node is self._top:  return 1
+        if node is self._root: return len(self._folders)
+        if node is not None:   return len(self.lib.get(node.name, []))
+        return 0
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 1
+
+    def flags(self, index):
+        if not index.isValid(): return QtCore.Qt.NoItemFlags
+        f = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+        kind = self.kind(index)
+        if kind == self.KIND_FOLDER: f |= QtCore.Qt.ItemIsDropEnabled
+        if kind == self.KIND_MAT:    f |= QtCore.Qt.ItemIsDragEnabled | QtCore.Qt.ItemIsDropEnabled
+        return f
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid(): return None
+        kind = self.kind(index)
+        if role == self.KIND_ROLE: return kind
+        if kind != self.KIND_MAT:
+            return self._node(index).name if role == QtCore.Qt.DisplayRole else None
+        m = self.material(index)
+        if m is None: return None
+        if role == QtCore.Qt.DisplayRole:    return self._live_names.get(m["id"], m.get("name",""))
+        if role == QtCore.Qt.DecorationRole: return self.owner._material_icon(m)
+        if role == self.MAT_ID_ROLE:         return m["id"]
+        return None
+
+    # ---- lookups ----
+    def kind(self, index):
+        if not index.isValid(): return None
+        p = index.internalPointer()
+        return self.KIND_ROOT if p is self._top else self.KIND_FOLDER if p is self._root else self.KIND_MAT
+
+    def material(self, index):
+        if self.kind(index) != self.KIND_MAT: return None
+        mats = self.lib.get(index.internalPointer().name, [])
+        return mats[index.row()] if index.row() < len(mats) else None
+
+    def folder_of(self, index):
+        kind = self.kind(index)
+        if kind == self.KIND_FOLDER: return self._node(index).name
+        if kind == self.KIND_MAT:    return index.internalPointer().name
+        return None
+
+    def root_index(self):
+        return self.createIndex(0, 0, self._top)
+
+    def folder_index(self, folder):
+        row = self._frow.get(folder)
+        return self.createIndex(row, 0, self._root) if row is not None else QtCore.QModelIndex()
+
+    def material_index(self, m):
+        mid = m.get("id")
+        folder = self.idx.folder_of(mid)
+        lst = self.lib.get(folder)
+        if lst is None: return QtCore.QModelIndex()
+        row = self._mrow.get(mid)
+        if row is None or row >= len(lst) or lst[row] is not m:
+            self._number(folder); row = self._mrow.get(mid)     # lib_data edited behind the model
+            if row is None or lst[row] is not m: return QtCore.QModelIndex()
+        return self.createIndex(row, 0, self._fnodes[folder])
+
+    def _number(self, folder, start=0):
+        lst = self.lib.get(folder) or []
+        for i in range(max(0, start), len(lst)):
+            self._mrow[lst[i].get("id")] = i
+
+    # ---- edits ----
+    def reset(self):
+        self.beginResetModel()
+        self._live_names.clear()
+        self._sync_folders()
+        self.idx.rebuild(self.lib)
+        self._mrow = {}
+        for folder in self._folders: self._number(folder)
+        self.endResetModel()
+
+    def add_folder(self, name):
+        row = len(self._folders)
+        self.beginInsertRows(self.root_index(), row, row)
+        self.lib[name] = []
+        self._sync_folders()
+        self.endInsertRows()
+        return self.folder_index(name)
+
+    def remove_folder(self, name):
+        row = self._frow.get(name)
+        if row is None: return []
+        self.beginRemoveRows(self.root_index(), row, row)
+        mats = self.lib.pop(name, None) or []
+        for m in mats: self.idx.discard(m); self._mrow.pop(m.get("id"), None)
+        self._sync_folders()
+        self.endRemoveRows()
+        return mats
+
+    def rename_folder(self, old, new):
+        # keeps the folder's position (lib_data is rebuilt in order, same dict)
+        items = [((new if k == old else k), v) for k, v in self.lib.items()]
+        self.lib.clear(); self.lib.update(items)
+        node = self._fnodes.pop(old); node.name = new; self._fnodes[new] = node
+        self._sync_folders()
+        self.idx.rename_folder(self.lib[new], new)
+        idx = self.folder_index(new)
+        self.dataChanged.emit(idx, idx)
+        return idx
+
+    def insert_materials(self, folder, mats, row=None):
+        if not mats: return
+        if folder not in self._frow: self.add_folder(folder)
+        lst = self.lib[folder]
+        row = len(lst) if row is None or row < 0 or row > len(lst) else row
+        self.beginInsertRows(self.folder_index(folder), row, row + len(mats) - 1)
+        lst[row:row] = mats
+        for m in mats: self.idx.add(m, folder)
+        self._number(folder, row)
+        self.endInsertRows()
+
+    def remove_material(self, m):
+        idx = self.material_index(m)
+        if not idx.isValid(): return False
+        folder = self.idx.folder_of(m["id"])
+        self.beginRemoveRows(idx.parent(), idx.row(), idx.row())
+        self.lib[folder].pop(idx.row())
+        self.idx.discard(m)
+        self._mrow.pop(m["id"], None); self._number(folder, idx.row())
+        self._live_names.pop(m["id"], None)
+        self.endRemoveRows()
+        return True
+
+    def move_material(self, m, dest_folder, dest_row=None):
+        # dest_row: position in the destination list after m has left its source
+        src = self.material_index(m)
+        if not src.isValid() or dest_folder not in self._frow: return False
+        src_folder, src_row = self.idx.folder_of(m["id"]), src.row()
+        dest = self.lib[dest_folder]
+        size = len(dest) - (1 if dest_folder == src_folder else 0)
+        dest_row = size if dest_row is None or dest_row < 0 or dest_row > size else dest_row
+        if dest_folder == src_folder and dest_row == src_row: return True
+        qt_row = dest_row + 1 if dest_folder == src_folder and dest_row > src_row else dest_row
+        if not self.beginMoveRows(src.parent(), src_row, src_row, self.folder_index(dest_folder), qt_row):
+            return False
+        self.lib[src_folder].pop(src_row)
+        dest.insert(dest_row, m)
+        self.idx.move(m, dest_folder)
+        if dest_folder == src_folder: self._number(src_folder, min(src_row, dest_row))
+        else:                         self._number(src_folder, src_row); self._number(dest_folder, dest_row)
+        self.endMoveRows()
+        return True
+
+    def material_changed(self, m):
+        idx = self.material_index(m)
+        if idx.isValid(): self.dataChanged.emit(idx, idx)
+
+    def set_live_name(self, m, text=None):
+        if text is None: self._live_names.pop(m["id"], None)
+        else:            self._live_names[m["id"]] = text
+        self.material_changed(m)
+
+
+class MaterialTree(QtWidgets.QTreeView):
     MIME = "application/x-mli-material"
 
     def __init__(self, owner_dialog, *a, **kw):
@@ -461,44 +968,44 @@ class MaterialTree(QtWidgets.QTreeWidget):
         self.setAcceptDrops(True)
         self.setDragDropMode(QtWidgets.QAbstractItemView.DragDrop)
         self.setDefaultDropAction(QtCore.Qt.MoveAction)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.setUniformRowHeights(True)
         self.viewport().setAcceptDrops(True)
 
-    def mimeTypes(self):
-        return [self.MIME]
-
-    def mimeData(self, items):
+    def _mime_for(self, index):
         md = QtCore.QMimeData()
-        if not items:
-            return md
-        it = items[0]
-        kind = it.data(0, self._dlg.KIND_ROLE)
-        if kind != self._dlg.KIND_MAT:
+        model = self.model()
+        if model.kind(index) != model.KIND_MAT:
             return md
-        mat_id = it.data(0, self._dlg.MAT_ID_ROLE)
-        src_folder = it.parent().text(0) if it.parent() else ""
-        payload = json.dumps({"mat_id": int(mat_id), "src_folder": src_folder})
+        payload = json.dumps({"mat_id": index.data(model.MAT_ID_ROLE), "src_folder": model.folder_of(index)})
         md.setData(self.MIME, payload.encode("utf-8"))
         return md
 
     def startDrag(self, supportedActions):
-        it = self.currentItem()
-        if not it:
+        idx = self.currentIndex()
+        if not idx.isValid():
             return
-        md = self.mimeData([it])
+        md = self._mime_for(idx)
         if not md or not md.hasFormat(self.MIME):
             return
         drag = QtGui.QDrag(self)
         drag.setMimeData(md)
         drag.exec_(QtCore.Qt.MoveAction)
 
+    def _event_pos(self, e):
+        return e.position().toPoint() if hasattr(e, "position") else e.pos()
+
+    def dragEnterEvent(self, e):
+        if e.mimeData().hasFormat(self.MIME): e.acceptProposedAction()
+        else: e.ignore()
+
     def dragMoveEvent(self, e: QtGui.QDragMoveEvent):
         if not e.mimeData().hasFormat(self.MIME):
             e.ignore(); return
-        it = self.itemAt(e.pos())
-        if not it:
+        idx = self.indexAt(self._event_pos(e))
+        if not idx.isValid():
             e.ignore(); return
-        kind = it.data(0, self._dlg.KIND_ROLE)
-        if kind in (self._dlg.KIND_FOLDER, self._dlg.KIND_MAT):
+        if self.model().kind(idx) in (self.model().KIND_FOLDER, self.model().KIND_MAT):
             e.setDropAction(QtCore.Qt.MoveAction)
             e.accept()
         else:
@@ -509,21 +1016,22 @@ class MaterialTree(QtWidgets.QTreeWidget):
             e.ignore(); return
         try:
             data = json.loads(bytes(e.mimeData().data(self.MIME)).decode("utf-8"))
-            mat_id = int(data["mat_id"]); src_folder = data["src_folder"]
+            mat_id = str(data["mat_id"]); src_folder = data["src_folder"]
         except Exception:
             e.ignore(); return
 
-        dest_item = self.itemAt(e.pos())
-        if not dest_item:
+        model = self.model()
+        dest = self.indexAt(self._event_pos(e))
+        if not dest.isValid():
             e.ignore(); return
 
-        dest_kind = dest_item.data(0, self._dlg.KIND_ROLE)
-        if dest_kind == self._dlg.KIND_FOLDER:
-            dest_folder = dest_item.text(0)
+        dest_kind = model.kind(dest)
+        if dest_kind == model.KIND_FOLDER:
+            dest_folder = model.folder_of(dest)
             insert_index = None
-        elif dest_kind == self._dlg.KIND_MAT:
-            dest_folder = dest_item.parent().text(0)
-            insert_index = dest_item.parent().indexOfChild(dest_item)
+        elif dest_kind == model.KIND_MAT:
+            dest_folder = model.folder_of(dest)
+            insert_index = dest.row()
         else:
             e.ignore(); return
 
@@ -540,14 +1048,108 @@ class MaterialTree(QtWidgets.QTreeWidget):
             e.ignore()
 
 
+# Import pipeline: read on a worker thread, texture writes on the I/O pool,
+# rebuild in batches on idle ticks
+
+class _ImportJob(QtCore.QObject):
+    BATCH = 16
+    finished = QtCore.Signal(bool)      # cancelled
+
+    def __init__(self, path, parent):
+        super().__init__(parent)
+        self.src = ms.LibraryStore(path)
+        self.imported, self.failed = [], []
+        self._queue = queue.Queue()
+        self._cancel = threading.Event()
+        self._dst_dir = mu._ensure_sourceimages()      # maya.cmds: main thread only
+        self._done = False
+
+        self._progress = QtWidgets.QProgressDialog("Reading library...", "Cancel", 0, 0, parent)
+        self._progress.setWindowTitle("Import")
+        self._progress.setWindowModality(QtCore.Qt.WindowModal)
+        self._progress.setMinimumDuration(300)
+        self._progress.setAutoClose(False); self._progress.setAutoReset(False)
+
+        self._timer = QtCore.QTimer(self); self._timer.setInterval(0)
+        self._timer.timeout.connect(self._step)
+
+    def start(self):
+        threading.Thread(target=self._read, name="MLI_ImportRead", daemon=True).start()
+        self._timer.start()
+
+    def _read(self):
+        # worker thread: files only, never maya.cmds
+        try:
+            lib = self.src.load()
+            mats = [m for v in (lib or {}).values() if isinstance(v, list) for m in v]
+            self._queue.put(("total", len(mats)))
+            for m in mats:
+                if self._cancel.is_set():
+                    break
+                graph = m["graph"] = ms.load_graph(m, [self.src])
+                tex = mu.materialize_embeds(graph, self.src.blobs, self._dst_dir) if graph else {}   # futures
+                self._queue.put(("mat", m, tex))
+        except Exception as e:
+            self._queue.put(("error", self.src.path, str(e)))
+        self._queue.put(("end",))
+
+    def _step(self):
+        if self._progress.wasCanceled():
+            self._cancel.set(); self._finish(True); return
+        batch, end = [], False
+        while len(batch) < self.BATCH and not end:
+            try: item = self._queue.get_nowait()
+            except queue.Empty: break
+            if item[0] == "total":
+                self._progress.setMaximum(item[1]); self._progress.setLabelText("Importing materials...")
+            elif item[0] == "mat":
+                batch.append(item[1:])
+            elif item[0] == "error":
+                self.failed.append(item[1:])
+            else:
+                end = True
+        if batch:
+            self._rebuild(batch)
+        if end:
+            self._finish(False)
+
+    def _rebuild(self, batch):
+        # one undo step per batch: rebuild_material_networks opens and closes its chunk
+        # in a finally, so nothing stays open between timer ticks
+        jobs = [(m["graph"], m.get("name",""), tex) for m, tex in batch if m.get("graph")]
+        try:
+            res = mu.rebuild_material_networks(jobs, blob_store=self.src.blobs)
+            names = iter(res.materials); self.failed.extend(res.failed)
+        except Exception as e:
+            names = iter([""] * len(jobs)); self.failed.append(("rebuild", str(e)))
+        for m, _tex in batch:
+            if m.get("graph"):
+                real = next(names, "")
+                if real: m["name"] = real
+            self.imported.append(m)
+        self._progress.setValue(len(self.imported))
+
+    def _finish(self, cancelled):
+        if self._done: return
+        self._done = True
+        self._timer.stop(); self._progress.close()
+        if cancelled:
+            while True:     # drop texture writes that have not started yet
+                try: item = self._queue.get_nowait()
+                except queue.Empty: break
+                for fut in (item[2].values() if item[0] == "mat" else ()):
+                    fut.cancel()
+        self.finished.emit(cancelled)
+
+
 # Main Dialog
 
 class MaterialLibraryDialog(QtWidgets.QDialog):
-    KIND_ROLE   = QtCore.Qt.UserRole
-    KIND_ROOT   = "root"
-    KIND_FOLDER = "folder"
-    KIND_MAT    = "material"
-    MAT_ID_ROLE = QtCore.Qt.UserRole + 1
+    KIND_ROLE   = LibraryTreeModel.KIND_ROLE
+    KIND_ROOT   = LibraryTreeModel.KIND_ROOT
+    KIND_FOLDER = LibraryTreeModel.KIND_FOLDER
+    KIND_MAT    = LibraryTreeModel.KIND_MAT
+    MAT_ID_ROLE = LibraryTreeModel.MAT_ID_ROLE
     _FILEINFO_KEY = "MLI_JSON"
 
     def __init__(self, parent=None):
@@ -561,16 +1163,58 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
         self.lib_data = {}          
         self.folder_counter = 1
         self.current_folder = None
-        self._tree_index, self._card_index = {}, {}
+        self._card_index = {}
         self._sized_once = False
         self._json_path = _scene_json_path()
+        self._sources = []          # ms.LibraryStores bodies/blobs may still live in (loaded / imported)
+        self._store = None          # ms.LibraryStore of the bound library
+        self._dirty = set()         # material ids whose body must be re-captured / re-written
+        self._index_dirty = False
+        self._prune_blobs = False   # drop unreferenced blobs on the next save (after re-thumbnail)
+        self._graph_watch = {}      # material id -> DG callback ids
+        self._graph_node = {}       # material id -> MObjectHandle of its material node
+        self._tex_paths = {}        # material id -> texture files of its last capture
+        self._unverified = set()    # loaded material ids not yet compared with the scene
+        self._watch_queue = []
+        self._watch_timer = QtCore.QTimer(self); self._watch_timer.setInterval(0)
+        self._watch_timer.timeout.connect(self._drain_watch_queue)
+        self._scene_cb = None       # DG callback ids of mu.watch_scene_assignments
+        self._scene_events = self._no_scene_events()
+        self._scene_timer = QtCore.QTimer(self); self._scene_timer.setSingleShot(True)
+        self._scene_timer.setInterval(250)
+        self._scene_timer.timeout.connect(self._apply_scene_events)
+        mq.THUMB_CACHE.add_size(TREE_ICON_SIZE); mq.THUMB_CACHE.add_size(PREVIEW_SIZE)
+        self._thumb_wait = {}       # thumb key -> {"mats": {id: m}, "tree": bool} awaiting a decode
+        self._b64_keys = {}         # material id -> (thumb_b64, its key) for unsaved thumbnails
+        mq.THUMB_CACHE.signals().ready.connect(self._on_thumb_ready)
+        self._thumb_cancel_timer = QtCore.QTimer(self); self._thumb_cancel_timer.setSingleShot(True)
+        self._thumb_cancel_timer.setInterval(80)
+        self._thumb_cancel_timer.timeout.connect(self._cancel_offscreen_thumbs)
 
         # left panel
         left = QtWidgets.QWidget(); left.setObjectName("LeftPanel")
         left_l = QtWidgets.QVBoxLayout(left); left_l.setContentsMargins(6,6,6,6)
+        self.lib_index = mi.LibraryIndex()
+        self._search_hits = None    # material ids matching the search box, None = no filter
+        self._search_version = None # lib_index.search.version the hits were computed at
+        self._tree_hidden = set()   # material ids whose tree row is hidden by the search
+        self.search_le = QtWidgets.QLineEdit()
+        self.search_le.setPlaceholderText("Search name, folder, asset, node type, texture")
+        self.search_le.setClearButtonEnabled(True)
+        self._search_timer = QtCore.QTimer(self); self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(120)
+        self._search_timer.timeout.connect(self._apply_search)
+        self.search_le.textChanged.connect(lambda *_: self._search_timer.start())
+        left_l.addWidget(self.search_le)
+        self.tree_model = LibraryTreeModel(self, self)
+        self._icon_placeholder = None
         self.tree = MaterialTree(self)   
+        self.tree.setModel(self.tree_model)
         self.tree.setHeaderHidden(True)
         self.tree.setIndentation(16); self.tree.setIconSize(TREE_ICON_SIZE)
+        self.tree_model.modelReset.connect(self._tree_hidden.clear)
+        for sig in (self.tree_model.modelReset, self.tree_model.rowsInserted, self.tree_model.rowsMoved, self.tree_model.dataChanged):
+            sig.connect(self._search_changed)
         left_l.addWidget(self.tree)
         lb = QtWidgets.QHBoxLayout()
         self.btn_create_folder = QtWidgets.QPushButton("Create Folder")
@@ -584,16 +1228,24 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
         right_l = QtWidgets.QVBoxLayout(right)
         title = QtWidgets.QLabel("Materials Detail"); title.setObjectName("TitleLabel"); title.setFocusPolicy(QtCore.Qt.NoFocus)
         right_l.addWidget(title)
-        self.scroll = QtWidgets.QScrollArea(); self.scroll.setWidgetResizable(True)
-        self.cards_container = QtWidgets.QWidget()
-        self.cards_layout = QtWidgets.QVBoxLayout(self.cards_container)
-        self.cards_layout.setSpacing(16); self.cards_layout.setContentsMargins(8,8,8,8)
-        self.cards_layout.addStretch()
-        self.scroll.setWidget(self.cards_container)
-        right_l.addWidget(self.scroll,1)
+        self.cards_model = MaterialCardModel(parent=self)
+        self.cards_view = MaterialCardView()
+        self.cards_view.setItemDelegate(MaterialCardDelegate(self, self.cards_view))
+        self.cards_view.setModel(self.cards_model)
+        self.cards_view.verticalScrollBar().valueChanged.connect(lambda *_: self._thumb_cancel_timer.start())
+        for sig in (self.cards_model.modelReset, self.cards_model.rowsInserted, self.cards_model.rowsRemoved):
+            sig.connect(lambda *_: self._thumb_cancel_timer.start())
+        right_l.addWidget(self.cards_view,1)
         right_l.addWidget(self._hline())
 
         hb = QtWidgets.QHBoxLayout()
+        self.btn_tools = QtWidgets.QToolButton(); self.btn_tools.setText("Tools")
+        self.btn_tools.setPopupMode(QtWidgets.QToolButton.InstantPopup)
+        self.tools_menu = QtWidgets.QMenu(self.btn_tools); self.btn_tools.setMenu(self.tools_menu)
+        self.tools_menu.addAction("Re-thumbnail Library", self.on_rethumbnail)
+        self.tools_menu.addSeparator()
+        self.tools_menu.addAction("Diagnostics...", self.on_diagnostics)
+        hb.addWidget(self.btn_tools)
         self.btn_refresh = QtWidgets.QPushButton("Refresh")
         self.btn_import  = QtWidgets.QPushButton("Import")
         self.btn_saveas  = QtWidgets.QPushButton("Save As")
@@ -610,8 +1262,8 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
         self.btn_create_folder.clicked.connect(self.on_create_folder)
         self.btn_add_material.clicked.connect(self.on_add_material)
         self.btn_delete.clicked.connect(self.on_delete)
-        self.tree.itemClicked.connect(self.on_tree_clicked)
-        self.tree.itemDoubleClicked.connect(self.on_tree_rename)
+        self.tree.clicked.connect(self.on_tree_clicked)
+        self.tree.doubleClicked.connect(self.on_tree_rename)
         self.btn_save.clicked.connect(self.on_save)
         self.btn_saveas.clicked.connect(self.on_save_as)
         self.btn_import.clicked.connect(self.on_import)
@@ -629,6 +1281,7 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
             self._scriptjobs.append(cmds.scriptJob(e=["SceneSaved",      self._autosave_current],     p=self.objectName()))
         except Exception:
             pass
+        self._watch_scene()
 
         QtCore.QTimer.singleShot(0, self._apply_initial_sizes)
 
@@ -656,18 +1309,29 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
     def _default_scene_side_json(self):
         return _scene_json_path()
 
+    def _open_store(self, path):
+        store = ms.LibraryStore(path)
+        self.lib_data = store.load()
+        self._store = store
+        self._sources = [store]
+        self._unwatch_all(); self._dirty.clear()
+        for mats in self.lib_data.values():
+            for m in mats:
+                m.setdefault("assets", []); m.setdefault("thumb_b64","")
+                if not m.get("id") or store.legacy:
+                    m.setdefault("id", ms.new_material_id()); self._dirty.add(m["id"])
+                self._unverified.add(m["id"])
+                self._watch_queue.append(m)
+        self._index_dirty = store.legacy
+        self._watch_timer.start()
+
+    @mp.timed("ui.load_from_path")
     def _load_from_path(self, path):
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                self.lib_data = json.load(f)
-            for mats in self.lib_data.values():
-                for m in mats:
-                    m.setdefault("assets", []); m.setdefault("thumb_b64","")
+            self._open_store(path)
             self._refresh_tree()
-            root = self.tree.topLevelItem(0)
-            if root:
-                self.tree.setCurrentItem(root)
-                self._rebuild_cards_for_all()
+            self.tree.setCurrentIndex(self.tree_model.root_index())
+            self._rebuild_cards_for_all()
         except Exception as e:
             self._warn("Load failed", str(e))
 
@@ -684,21 +1348,21 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
             self._bind_json(side)
             return
         self.lib_data = {}
+        self._store = None
+        self._unwatch_all(); self._dirty.clear(); self._index_dirty = False
         self._refresh_tree()
         self._rebuild_cards([])
 
     def _auto_on_scene_event(self, *args):
+        self._scene_timer.stop(); self._scene_events = self._no_scene_events()
         self._auto_load_for_current_scene()
-        self.refresh_from_scene()
 
     def _autosave_current(self, *args):
-        self._gather_graphs()
         dst = self._get_bound_json_path() or self._default_scene_side_json()
         if not dst:
             return
         try:
-            with open(dst, "w", encoding="utf-8") as f:
-                json.dump(self.lib_data, f, ensure_ascii=False, indent=2)
+            self._write_json(dst)
             self._bind_json(dst)
         except Exception:
             pass
@@ -709,40 +1373,159 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
 
     def _apply_initial_sizes(self):
         self.splitter.setSizes([LEFT_PANEL_W, max(300, self.width()-LEFT_PANEL_W)])
-        root = self.tree.topLevelItem(0)
-        if root:
-            self.tree.setCurrentItem(root)
-            self._rebuild_cards_for_all()
+        self.tree.setCurrentIndex(self.tree_model.root_index())
+        self._rebuild_cards_for_all()
 
     def _hline(self):
         l = QtWidgets.QFrame(); l.setFrameShape(QtWidgets.QFrame.HLine); l.setFrameShadow(QtWidgets.QFrame.Sunken); return l
 
+    def _thumb_key(self, m: dict) -> str:
+        # an unsaved thumbnail is keyed like the blob it will be stored as, so its
+        # decoded pixmap stays valid after save; hashed once per material
+        b64, mid = m.get("thumb_b64") or "", m.get("id")
+        if not b64:
+            self._b64_keys.pop(mid, None)
+            return m.get("thumb") or ""
+        known = self._b64_keys.get(mid)
+        if known is None or known[0] is not b64:
+            try: raw = base64.b64decode(b64)
+            except Exception: raw = b""
+            known = self._b64_keys[mid] = (b64, ms.thumb_key(raw) if raw else "")
+        return known[1]
+
+    def _thumb_pixmap(self, m: dict, size=PREVIEW_SIZE, for_tree=False):
+        # Decoded once per content key into mq.THUMB_CACHE, shared by tree and
+        # cards. A miss queues a background decode and returns None (placeholder);
+        # _on_thumb_ready() updates the waiting rows when the image lands.
+        key = self._thumb_key(m)
+        if not key: return QtGui.QPixmap()
+        pm = mq.THUMB_CACHE.get(key, size)
+        if pm is not None: return pm
+        wait = self._thumb_wait.setdefault(key, {"mats": {}, "tree": False})
+        wait["mats"][m.get("id")] = m; wait["tree"] = wait["tree"] or for_tree
+        b64 = m.get("thumb_b64") or ""
+        sources = list(self._sources)
+        load = (lambda: base64.b64decode(b64)) if b64 else (lambda: ms.load_thumb_bytes(m, sources))
+        mq.THUMB_CACHE.request(key, load, 0 if for_tree else 1)
+        return None
+
     def _material_icon(self, m: dict):
-        b64 = m.get("thumb_b64","")
-        if b64:
-            ic = _qicon_from_b64(b64)
-            if not ic.isNull(): return ic
-        pm = QtGui.QPixmap(48,48); pm.fill(QtGui.QColor("#777"))
-        return QtGui.QIcon(pm)
-
-    def _merge_scene_assets(self, m: dict):
+        pm = self._thumb_pixmap(m, TREE_ICON_SIZE, for_tree=True)
+        if pm is not None and not pm.isNull():
+            return QtGui.QIcon(pm)
+        if self._icon_placeholder is None:
+            pm = QtGui.QPixmap(48,48); pm.fill(QtGui.QColor("#777"))
+            self._icon_placeholder = QtGui.QIcon(pm)
+        return self._icon_placeholder
+
+    def _on_thumb_ready(self, key):
+        wait = self._thumb_wait.pop(key, None)
+        for m in (wait or {}).get("mats", {}).values():
+            self.tree_model.material_changed(m)
+            self.cards_model.material_changed(m)
+            card = self._card_index.get(m.get("id"))
+            if card: card._show_thumb()
+
+    def _cancel_offscreen_thumbs(self):
+        # drop queued card-only decodes for rows that scrolled out of view
+        vp = self.cards_view.viewport().rect()
+        top = self.cards_view.indexAt(vp.topLeft())
+        bottom = self.cards_view.indexAt(vp.bottomLeft())
+        first = top.row() if top.isValid() else 0
+        last = bottom.row() if bottom.isValid() else self.cards_model.rowCount() - 1
+        visible = set()
+        for row in range(max(0, first), last + 1):
+            m = self.cards_model.index(row).data(MaterialCardModel.MAT_ROLE)
+            if m: visible.add(self._thumb_key(m))
+        for key in [k for k, w in self._thumb_wait.items() if not w["tree"] and k not in visible]:
+            if mq.THUMB_CACHE.cancel(key):
+                self._thumb_wait.pop(key, None)
+
+    # change tracking
+    def _mark_dirty(self, m: dict):
+        if m.get("id"): self._dirty.add(m["id"])
+        self._index_dirty = True
+
+    def _watch_graph(self, m: dict):
+        mid = m.get("id")
+        self._unwatch_graph(mid)
+        w = mu.watch_material_network(m.get("name",""), lambda mid=mid: self._dirty.add(mid)) if hasattr(mu, "watch_material_network") else None
+        if w is not None:
+            self._graph_watch[mid], handle = w
+            if handle is not None: self._graph_node[mid] = handle
+
+    def _unwatch_graph(self, mid):
+        mu.remove_callbacks(self._graph_watch.pop(mid, None)); self._graph_node.pop(mid, None)
+
+    def _unwatch_all(self):
+        self._watch_timer.stop(); self._watch_queue = []
+        for ids in self._graph_watch.values():
+            mu.remove_callbacks(ids)
+        self._graph_watch.clear(); self._graph_node.clear()
+        self._tex_paths.clear(); self._unverified.clear()
+
+    def _drain_watch_queue(self, chunk=25):
+        # Loading stays index-only: networks of loaded materials only start being
+        # watched here, a few per tick. Comparing them with the library waits for
+        # the next save (_gather_graphs), where the index's graph hash avoids
+        # reading bodies.
+        batch, self._watch_queue = self._watch_queue[:chunk], self._watch_queue[chunk:]
+        for m in batch:
+            if "terms" not in m:     # library saved before search terms were indexed
+                try: self.lib_index.set_terms(m, ms.graph_terms(ms.load_graph(m, self._sources))); self._index_dirty = True
+                except Exception: pass
+            if m.get("id") in self._graph_watch: continue
+            self._watch_graph(m)
+        if not self._watch_queue:
+            self._watch_timer.stop()
+
+    def _textures_changed(self, mid, blobs, paths=None):
+        # an overwritten texture file changes no DG attribute, so the watch never sees it
+        if blobs is None: return False
+        return any(blobs.source_changed(p) for p in (self._tex_paths.get(mid, ()) if paths is None else paths))
+
+    def _recapture(self, m: dict, blobs=None) -> bool:
+        # blobs: ms.BlobStore the next save writes to; textures changed on disk since
+        # they were hashed into it also count as a change
+        name, mid = m.get("name",""), m.get("id")
+        if not (hasattr(mu, "capture_material_network") and cmds and cmds.objExists(name)):
+            return False
+        graph = mu.capture_material_network(name)
+        self._tex_paths[mid] = ms.embed_paths(graph); self._unverified.discard(mid)
+        if mid in self._dirty or self._textures_changed(mid, blobs): changed = True
+        elif m.get("ghash"): changed = ms.graph_hash(graph) != m["ghash"]     # no body read
+        else:                changed = not ms.same_graph(graph, ms.load_graph(m, self._sources))
+        if changed:
+            m["graph"] = graph; self._dirty.add(mid)
+            self.lib_index.set_terms(m, ms.graph_terms(graph))
+            return True
+        return False
+
+    def _merge_scene_assets(self, m: dict, scan=None) -> bool:
+        # adds scene objects not listed yet; True when m["assets"] grew.
+        # scan: result of mu.scan_material_assignments() shared by a whole refresh
         name = m.get("name","")
-        if not name or not hasattr(mu, "objects_using_material"): return
-        try: scene_objs = mu.objects_using_material(name, True) or []
-        except Exception: scene_objs = []
-        if scene_objs:
-            merged = set(m.get("assets", []) or []); merged.update(scene_objs)
-            m["assets"] = sorted(merged)
-
-    def _focus_card_by_id(self, mat_id: int):
-        card = self._card_index.get(mat_id)
-        if not card: return
+        if not name: return False
+        if scan is not None:
+            scene_objs = scan.get(name) or []
+        elif hasattr(mu, "objects_using_material"):
+            try: scene_objs = mu.objects_using_material(name, True) or []
+            except Exception: scene_objs = []
+        else:
+            return False
+        if scene_objs and self.lib_index.link(m, scene_objs):
+            self._index_dirty = True
+            return True
+        return False
+
+    def _focus_card_by_id(self, mat_id: str):
+        if not self.cards_model.index_of(mat_id).isValid(): return
         def _do():
-            y_top = card.mapTo(self.cards_container, QtCore.QPoint(0, 0)).y()
-            sb = self.scroll.verticalScrollBar()
-            TOP_PAD = 6
-            sb.setValue(max(0, y_top - TOP_PAD))
-            card.setFocus(QtCore.Qt.OtherFocusReason)
+            idx = self.cards_model.index_of(mat_id)
+            if not idx.isValid(): return
+            self.cards_view.scrollTo(idx, QtWidgets.QAbstractItemView.PositionAtTop)
+            card = self.cards_view.open_card(idx)
+            if card: card.setFocus(QtCore.Qt.OtherFocusReason)
         QtCore.QTimer.singleShot(0, _do)
 
     def showEvent(self, e):
@@ -752,35 +1535,17 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
 
     def _on_card_thumb_changed(self, mat_ref: dict):
         
-        try:
-            item = self._tree_index.get(id(mat_ref))
-            if not item:
-                return
-            item.setIcon(0, self._material_icon(mat_ref))
-            
-            self.tree.viewport().update()
-        except Exception:
-            pass
+        self._mark_dirty(mat_ref)
+        self.cards_model.material_changed(mat_ref)
+        self.tree_model.material_changed(mat_ref)
 
-    # tree build
+    # tree build: full reset only when lib_data is replaced (load / scene switch);
+    # everything else goes through tree_model's row-level edits
+    @mp.timed("ui.refresh_tree")
     def _refresh_tree(self):
-        self._tree_index.clear(); self.tree.clear()
-        root = QtWidgets.QTreeWidgetItem(["All Material"])
-        root.setData(0, self.KIND_ROLE, self.KIND_ROOT)
-        self.tree.addTopLevelItem(root)
-
-        for folder, mats in self.lib_data.items():
-            f_item = QtWidgets.QTreeWidgetItem([folder])
-            f_item.setData(0, self.KIND_ROLE, self.KIND_FOLDER)
-            root.addChild(f_item)
-            for m in mats:
-                c_item = QtWidgets.QTreeWidgetItem([m["name"]])
-                c_item.setData(0, self.KIND_ROLE, self.KIND_MAT)
-                c_item.setData(0, self.MAT_ID_ROLE, id(m))
-                c_item.setIcon(0, self._material_icon(m))
-                f_item.addChild(c_item)
-                self._tree_index[id(m)] = c_item
+        self.tree_model.reset()
         self.tree.expandAll()
+        self.refresh_from_scene()       # one sweep; scene callbacks keep assets current after this
 
     def _rebuild_cards_for_all(self):
         mats_all = []
@@ -792,65 +1557,94 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
         mats = self.lib_data.get(folder_name, [])
         self._rebuild_cards(mats)
 
+    def _cards_source(self, index):
+        # materials the cards show for a tree index, before the search filter
+        kind = self.tree_model.kind(index)
+        if kind in (self.KIND_FOLDER, self.KIND_MAT):
+            return self.lib_data.get(self.tree_model.folder_of(index), [])
+        return [m for mats in self.lib_data.values() for m in mats]
+
+    def _search_filter(self, mats_list):
+        if self._search_hits is None: return list(mats_list)
+        return [m for m in mats_list if m.get("id") in self._search_hits]
+
+    @mp.timed("ui.rebuild_cards")
     def _rebuild_cards(self, mats_list):
-        while self.cards_layout.count():
-            it = self.cards_layout.takeAt(0)
-            w = it.widget()
-            if w: w.deleteLater()
-        self._card_index.clear()
-
-        for m in mats_list:
-            self._merge_scene_assets(m)
-            card = MaterialCard(m, self.cards_container)
-            card.nameEditedLive.connect(self._card_name_live)
-            card.nameCommitted.connect(self._card_name_commit)
-            card.requestEdit.connect(self._card_edit_material)
-            card.requestSelect.connect(self._card_select_objs)
-            card.requestLink.connect(self._card_link_material)
-            card.thumbChanged.connect(lambda mm, self=self: self._on_card_thumb_changed(mm))
-
-            self.cards_layout.addWidget(card)
-            self._card_index[id(m)] = card
-
-        self.cards_layout.addStretch()
+        self.cards_model.set_materials(self._search_filter(mats_list))
+
+    def _make_card(self, m, parent):
+        card = MaterialCard(m, parent, thumb_source=self._thumb_pixmap)
+        card.nameEditedLive.connect(self._card_name_live)
+        card.nameCommitted.connect(self._card_name_commit)
+        card.requestEdit.connect(self._card_edit_material)
+        card.requestSelect.connect(self._card_select_objs)
+        card.requestLink.connect(self._card_link_material)
+        card.thumbChanged.connect(lambda mm, self=self: self._on_card_thumb_changed(mm))
+        card.assetsChanged.connect(self._on_card_assets_changed)
+        self._card_index[m.get("id")] = card
+        return card
+
+    def _forget_card(self, card):
+        for k in [k for k, c in self._card_index.items() if c is card]:
+            self._card_index.pop(k, None)
+
+    def _update_card(self, m, name=None):
+        self._search_changed()
+        self.cards_model.material_changed(m)
+        card = self._card_index.get(m.get("id"))
+        if card:
+            if name is not None: card.set_name(name)
+            card.refresh()
+
+    def _on_card_assets_changed(self, mat_ref):
+        self.lib_index.sync_assets(mat_ref)
+        self._index_dirty = True
+        self.cards_model.material_changed(mat_ref)
+
+    # search: LibraryIndex.search answers the query; the tree hides rows and
+    # the cards show the matches inside the current tree selection. Edits only
+    # re-query when an indexed token changed (not live names or icons).
+    def _search_changed(self, *args):
+        if self._search_hits is not None and self.lib_index.search.version != self._search_version:
+            self._search_timer.start()
+
+    def _apply_search(self):
+        hits = self.lib_index.search.query(self.search_le.text())
+        self._search_hits, self._search_version = hits, self.lib_index.search.version
+        tm, hidden = self.tree_model, self._tree_hidden
+        for folder, mats in self.lib_data.items():
+            fidx, shown = tm.folder_index(folder), False
+            for row, m in enumerate(mats):
+                hide = hits is not None and m["id"] not in hits
+                shown = shown or not hide
+                if hide != (m["id"] in hidden):
+                    self.tree.setRowHidden(row, fidx, hide)
+                    if hide: hidden.add(m["id"])
+                    else:    hidden.discard(m["id"])
+            self.tree.setRowHidden(fidx.row(), tm.root_index(), hits is not None and not shown)
+            if hits is not None and shown: self.tree.expand(fidx)
+        cur = self.tree.currentIndex()
+        visible = cur.isValid() and not any(self.tree.isRowHidden(i.row(), i.parent()) for i in (cur, cur.parent()) if i.isValid())
+        self.cards_model.sync_materials(self._search_filter(self._cards_source(cur if visible else tm.root_index())))
 
     # -------- Drag/Drop backend --------
-    def _move_material_between_folders(self, mat_id: int, src_folder: str, dest_folder: str, insert_index=None) -> bool:
+    def _move_material_between_folders(self, mat_id: str, src_folder: str, dest_folder: str, insert_index=None) -> bool:
         
         if not src_folder or not dest_folder: return False
-        src_list = self.lib_data.get(src_folder, [])
-        if not src_list: return False
-
-        ref, src_idx = None, -1
-        for i, m in enumerate(src_list):
-            if id(m) == mat_id:
-                ref, src_idx = m, i; break
-        if ref is None: return False
-
-        
-        src_list.pop(src_idx)
+        ref = self.lib_index.get(mat_id)
+        if ref is None or self.lib_index.folder_of(mat_id) != src_folder: return False
+        if not self.tree_model.move_material(ref, dest_folder, insert_index): return False
+        self._index_dirty = True
+        self.tree.expand(self.tree_model.folder_index(dest_folder))
 
-        
-        dest_list = self.lib_data.setdefault(dest_folder, [])
-        if insert_index is None or insert_index < 0 or insert_index > len(dest_list):
-            dest_list.append(ref)
-        else:
-            dest_list.insert(insert_index, ref)
-
-        
-        self._refresh_tree()
-        
         self._rebuild_cards_for_folder(dest_folder)
-        it = self._tree_index.get(id(ref))
-        if it:
-            self.tree.setCurrentItem(it)
-            self._focus_card_by_id(id(ref))
+        self.tree.setCurrentIndex(self.tree_model.material_index(ref))
+        self._focus_card_by_id(mat_id)
         return True
 
     # card callbacks
     def _card_name_live(self, mat_ref, text):
-        item = self._tree_index.get(id(mat_ref))
-        if item: item.setText(0, text)
+        self.tree_model.set_live_name(mat_ref, text)
 
     def _rename_strict(self, old_name: str, new_name: str) -> bool:
         if not cmds:
@@ -868,21 +1662,18 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
     def _card_name_commit(self, mat_ref, text):
         old = mat_ref.get("name",""); new = (text or "").strip()
         if not new or new == old:
-            item = self._tree_index.get(id(mat_ref))
-            if item: item.setText(0, old)
+            self.tree_model.set_live_name(mat_ref, None)
             return
         if self._rename_strict(old, new):
             mat_ref["name"] = new
-            item = self._tree_index.get(id(mat_ref))
-            if item: item.setText(0, new)
-            card = self._card_index.get(id(mat_ref))
-            if card: card.set_name(new)
+            self.lib_index.rename(mat_ref, old)
+            self._mark_dirty(mat_ref)
+            self.tree_model.set_live_name(mat_ref, None)
             self._merge_scene_assets(mat_ref)
-            if card: card.refresh()
+            self._update_card(mat_ref, new)
         else:
-            item = self._tree_index.get(id(mat_ref));  card = self._card_index.get(id(mat_ref))
-            if item: item.setText(0, old)
-            if card: card.set_name(old)
+            self.tree_model.set_live_name(mat_ref, None)
+            self._update_card(mat_ref, old)
 
     def _card_edit_material(self, mat_ref):
         if hasattr(mu, "open_hypershade"):
@@ -898,19 +1689,6 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
         except Exception as e:
             self._warn("Select Objects", str(e))
 
-    def _remove_from_other_assets(self, objects, keep_material):
-        if not objects: return
-        objs = set(objects)
-        for folder, mats in self.lib_data.items():
-            for m in mats:
-                if m.get("name") == keep_material: continue
-                if not m.get("assets"): continue
-                new_list = [x for x in m["assets"] if x not in objs]
-                if len(new_list) != len(m["assets"]):
-                    m["assets"] = new_list
-                    card = self._card_index.get(id(m))
-                    if card: card.refresh()
-
     def _card_link_material(self, mat_ref):
         name = (mat_ref or {}).get("name","")
         if not hasattr(mu, "link_material_to_objects"): return
@@ -921,31 +1699,27 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
         if not affected:
             QtWidgets.QMessageBox.information(self, "Link Material", "Please select object(s) in the scene first.")
             return
-        self._remove_from_other_assets(affected, keep_material=name)
-        assets = set(mat_ref.setdefault("assets", [])); assets.update(affected)
-        mat_ref["assets"] = sorted(assets)
-        card = self._card_index.get(id(mat_ref))
-        if card: card.refresh()
+        # the reverse index names the previous owners, so only they are touched
+        for m in self.lib_index.reassign(affected, mat_ref):
+            self._update_card(m)
+        self._index_dirty = True
+        self._update_card(mat_ref)
 
     # actions
     def on_create_folder(self):
         name = f"Folder {self.folder_counter}"
         while name in self.lib_data:
             self.folder_counter += 1; name = f"Folder {self.folder_counter}"
-        self.lib_data[name] = []; self.folder_counter += 1
-        self._refresh_tree()
+        self.folder_counter += 1
+        self.tree_model.add_folder(name)
+        self._index_dirty = True
 
     def on_add_material(self):
         sel_name = mu.get_selected_material_name() if hasattr(mu, "get_selected_material_name") else ""
         if not sel_name:
             self._warn("Add Material", "Please select a material in Hypershade first."); return
 
-        item = self.tree.currentItem()
-        if not item:
-            self._warn("Add Material", "Select a folder first."); return
-        kind = item.data(0, self.KIND_ROLE)
-        folder = item.text(0) if kind == self.KIND_FOLDER else (item.parent().text(0) if kind == self.KIND_MAT else None)
-        if kind == self.KIND_ROOT: folder = None
+        folder = self.tree_model.folder_of(self.tree.currentIndex())
         if not folder:
             self._warn("Add Material", "Select a folder first."); return
 
@@ -958,87 +1732,106 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
                 data["graph"] = mu.capture_material_network(data.get("name",""))
         except Exception:
             data["graph"] = {}
+        data["id"] = ms.new_material_id()
+        data["terms"] = ms.graph_terms(data.get("graph"))
+        self._mark_dirty(data)
+        self._watch_graph(data)
 
-        mats = self.lib_data.setdefault(folder, [])
-        mats.append(data)
-        self._refresh_tree()
+        self.tree_model.insert_materials(folder, [data])
         self._rebuild_cards_for_folder(folder)
-        self._focus_card_by_id(id(data))
+        self._focus_card_by_id(data["id"])
 
-    def on_tree_clicked(self, item, _col):
-        kind = item.data(0, self.KIND_ROLE)
+    def on_tree_clicked(self, index):
+        kind = self.tree_model.kind(index)
         if kind == self.KIND_ROOT:
             self._rebuild_cards_for_all()
         elif kind == self.KIND_FOLDER:
-            self._rebuild_cards_for_folder(item.text(0))
+            self._rebuild_cards_for_folder(self.tree_model.folder_of(index))
         elif kind == self.KIND_MAT:
-            folder = item.parent().text(0)
-            self._rebuild_cards_for_folder(folder)
-            self._focus_card_by_id(item.data(0, self.MAT_ID_ROLE))
+            self._rebuild_cards_for_folder(self.tree_model.folder_of(index))
+            self._focus_card_by_id(index.data(self.MAT_ID_ROLE))
 
-    def on_tree_rename(self, item, _col):
-        kind = item.data(0, self.KIND_ROLE)
-        if kind == self.KIND_ROOT: return
-        old = item.text(0)
+    def on_tree_rename(self, index):
+        kind = self.tree_model.kind(index)
+        if kind not in (self.KIND_FOLDER, self.KIND_MAT): return
+        old = index.data(QtCore.Qt.DisplayRole) or ""
         new, ok = QtWidgets.QInputDialog.getText(self, "Rename", "New name:", text=old)
         if not ok or not new or new == old: return
 
         if kind == self.KIND_FOLDER:
             if new in self.lib_data:
                 self._warn("Rename", "Folder already exists."); return
-            self.lib_data[new] = self.lib_data.pop(old)
-            self._refresh_tree(); self._rebuild_cards_for_folder(new)
+            self.tree_model.rename_folder(old, new)
+            self._index_dirty = True
+            self._rebuild_cards_for_folder(new)
         else:
-            folder = item.parent().text(0)
-            mats = self.lib_data.get(folder, []); mat_id = item.data(0, self.MAT_ID_ROLE)
-            ref = next((m for m in mats if id(m) == mat_id), None)
+            ref = self.tree_model.material(index)
             if not ref: return
-            real_old = ref.get("name","")
-            if self._rename_strict(real_old, new):
+            old = ref.get("name","")
+            if self._rename_strict(old, new):
                 ref["name"] = new
-                item.setText(0, new)
-                card = self._card_index.get(mat_id)
-                if card: card.set_name(new)
+                self.lib_index.rename(ref, old)
+                self._mark_dirty(ref)
+                self.tree_model.material_changed(ref)
                 self._merge_scene_assets(ref)
-                if card: card.refresh()
-                self._focus_card_by_id(mat_id)
-            else:
-                item.setText(0, real_old)
+                self._update_card(ref, new)
+                self._focus_card_by_id(ref["id"])
 
     def on_delete(self):
-        item = self.tree.currentItem()
-        if not item: return
-        kind = item.data(0, self.KIND_ROLE)
+        index = self.tree.currentIndex()
+        if not index.isValid(): return
+        kind = self.tree_model.kind(index)
         if kind == self.KIND_FOLDER:
-            name = item.text(0)
-            self.lib_data.pop(name, None)
-            item.parent().removeChild(item)
+            for m in self.tree_model.remove_folder(self.tree_model.folder_of(index)):
+                self._unwatch_graph(m.get("id"))
+            self._index_dirty = True
             self._rebuild_cards([])
         elif kind == self.KIND_MAT:
-            folder = item.parent().text(0)
-            mat_id = item.data(0, self.MAT_ID_ROLE)
-            mats = self.lib_data.get(folder, [])
-            self.lib_data[folder] = [m for m in mats if id(m) != mat_id]
-            item.parent().removeChild(item)
+            folder, ref = self.tree_model.folder_of(index), self.tree_model.material(index)
+            self._unwatch_graph(ref.get("id"))
+            self.tree_model.remove_material(ref)
+            self._index_dirty = True
             self._rebuild_cards_for_folder(folder)
         else:
             QtWidgets.QMessageBox.information(self, "Delete", "Root cannot be deleted.")
 
     # -------- Save / Save As / Import ----------
-    def _gather_graphs(self):
+    @mp.timed("ui.gather_graphs")
+    def _gather_graphs(self, on_captured=None, blobs=None):
+        # Only re-capture what changed: watched networks report edits through
+        # their DG callbacks, unwatched ones (no OpenMaya) are always captured,
+        # and textures are checked against the size / mtime they were hashed at
+        # in blobs. on_captured(m) lets the caller start writing a body while
+        # the next network is still being captured.
         for folder, mats in self.lib_data.items():
             for m in mats:
-                name = m.get("name","")
+                mid = m.get("id")
+                if (mid in self._graph_watch and mid not in self._dirty and mid not in self._unverified
+                        and not self._textures_changed(mid, blobs)):
+                    continue
                 try:
-                    if hasattr(mu, "capture_material_network") and cmds and cmds.objExists(name):
-                        m["graph"] = mu.capture_material_network(name)
+                    if self._recapture(m, blobs):
+                        self._watch_graph(m)        # nodes wired in since the last watch
+                        if on_captured: on_captured(m)
+                    elif mid not in self._graph_watch:
+                        self._watch_graph(m)
                 except Exception:
                     pass
 
+    @mp.timed("ui.write_json")
     def _write_json(self, path):
-        self._gather_graphs()
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.lib_data, f, ensure_ascii=False, indent=2)
+        path = os.path.abspath(path)
+        same = self._store is not None and os.path.normcase(self._store.path) == os.path.normcase(path)
+        store = self._store if same else ms.LibraryStore(path)
+        pending = {}
+        self._gather_graphs(lambda m: pending.__setitem__(m["id"], store.submit_body(m, self._sources)), store.blobs)
+        if same and not self._dirty and not self._index_dirty and os.path.isfile(path):
+            return
+        store.save(self.lib_data, self._dirty, self._sources, pending, prune_blobs=self._prune_blobs and same)
+        self._dirty.clear(); self._index_dirty = False; self._prune_blobs = False
+        self._store = store
+        if all(s.path != store.path for s in self._sources):
+            self._sources.append(store)
 
     def on_save(self):
         if not self._json_path:
@@ -1062,8 +1855,11 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
     def on_save_as(self):
         default_dir = os.path.dirname(cmds.file(q=True, sn=True)) if cmds and cmds.file(q=True, sn=True) else os.path.expanduser("~")
         default_path = os.path.join(default_dir, "material_library.json")
-        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save Library As", default_path, "Material Library (*.json)")
+        path, flt = QtWidgets.QFileDialog.getSaveFileName(self, "Save Library As", default_path, _library_filters(save=True))
         if not path: return
+        want = next((c for c in ms.COMPRESSIONS if flt.endswith("*.json%s)" % c)), "")
+        if want and not ms.compression_of(path):
+            path += want if path.lower().endswith(".json") else ".json" + want
         try:
             self._write_json(path)
             self._bind_json(path)
@@ -1075,69 +1871,180 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
         start_dir = self._default_scene_side_json() or os.path.expanduser("~")
         if isinstance(start_dir, str) and start_dir.endswith(".json"):
             start_dir = os.path.dirname(start_dir)
-        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Import Library", start_dir or os.path.expanduser("~"), "Material Library (*.json)")
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Import Library", start_dir or os.path.expanduser("~"), _library_filters())
         if not path: return
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                incoming = json.load(f)
-        except Exception as e:
-            self._warn("Import failed", str(e)); return
-
         folders = list(self.lib_data.keys())
         if not folders:
             dest_folder, ok = QtWidgets.QInputDialog.getText(self, "Destination Folder", "Folder name:", text="Imported")
             if not ok or not dest_folder: return
-            self.lib_data[dest_folder] = []
+            self.tree_model.add_folder(dest_folder)
+            self._index_dirty = True
         else:
             dest_folder, ok = QtWidgets.QInputDialog.getItem(self, "Destination Folder", "Choose a folder:", folders, 0, False)
             if not ok: return
 
-        mats_in = []
-        for k, v in (incoming or {}).items():
-            if isinstance(v, list): mats_in.extend(v)
-
-        for m in mats_in:
-            snap = (m.get("graph") or {})
-            if snap and hasattr(mu, "rebuild_material_network"):
-                try:
-                    real_name = mu.rebuild_material_network(snap, new_material_name=m.get("name",""))
-                    if real_name: m["name"] = real_name
-                except Exception:
-                    pass
-            self._merge_scene_assets(m)
-            self.lib_data.setdefault(dest_folder, []).append(m)
+        job = _ImportJob(path, self)
+        if all(s.path != job.src.path for s in self._sources):
+            self._sources.append(job.src)
+        job.finished.connect(lambda cancelled, job=job, dest=dest_folder: self._on_import_finished(job, dest, cancelled))
+        job.start()
+
+    def _on_import_finished(self, job, dest_folder, cancelled):
+        if dest_folder not in self.lib_data: self.tree_model.add_folder(dest_folder)
+        for m in job.imported:
+            m["id"] = ms.new_material_id()
+            m.setdefault("assets", []); m.setdefault("thumb_b64","")
+            if m.get("graph"): m["terms"] = ms.graph_terms(m["graph"])
+            if not m.get("graph"):
+                self._merge_scene_assets(m)
+            self._mark_dirty(m)
+            self._watch_queue.append(m)
+        self.tree_model.insert_materials(dest_folder, job.imported)
+        self._watch_timer.start()
 
-        self._refresh_tree()
-        root = self.tree.topLevelItem(0)
-        for i in range(root.childCount()):
-            ch = root.child(i)
-            if ch.text(0) == dest_folder:
-                self.tree.setCurrentItem(ch); break
+        self.tree.expand(self.tree_model.folder_index(dest_folder))
+        self.tree.setCurrentIndex(self.tree_model.folder_index(dest_folder))
         self._rebuild_cards_for_folder(dest_folder)
 
+        if job.failed or cancelled:
+            box = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Information, "Import",
+                "Imported %d material(s)%s. %d node/plug operation(s) failed."
+                % (len(job.imported), " before cancel" if cancelled else "", len(job.failed)), parent=self)
+            if job.failed:
+                box.setDetailedText("\n".join("%s: %s" % f for f in job.failed))
+            box.exec_()
+        job.deleteLater()
+
    
+    def on_rethumbnail(self):
+        # bulk-normalize existing thumbnails (<= mq.THUMB_MAX px, WebP/PNG)
+        mats = [m for v in self.lib_data.values() for m in v if m.get("thumb_b64") or m.get("thumb")]
+        if not mats:
+            QtWidgets.QMessageBox.information(self, "Re-thumbnail", "No thumbnails to convert."); return
+        sources = list(self._sources)
+        def _convert(m):
+            raw = base64.b64decode(m["thumb_b64"]) if m.get("thumb_b64") else ms.load_thumb_bytes(m, sources)
+            return raw, mq.normalize_thumbnail(raw) if raw else raw
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            results = list(ms.io_pool().map(_convert, mats))
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        before = after = 0; changed = []
+        for m, (raw, new) in zip(mats, results):
+            before += len(raw or b""); after += len(new or b"")
+            if new and new != raw:
+                m["thumb_b64"] = base64.b64encode(new).decode("utf-8")
+                self._mark_dirty(m); changed.append(m)
+        if changed:
+            self._prune_blobs = True
+            for m in changed: self.tree_model.material_changed(m); self._update_card(m)
+        QtWidgets.QMessageBox.information(self, "Re-thumbnail",
+            "Converted %d of %d thumbnail(s): %.1f MB -> %.1f MB.\nSave the library to write the change."
+            % (len(changed), len(mats), before / 1048576.0, after / 1048576.0))
+
+    def on_diagnostics(self):
+        if getattr(self, "_diag", None) is None:
+            self._diag = DiagnosticsDialog(self)
+        self._diag.show(); self._diag.raise_(); self._diag.activateWindow()
+
+    @mp.timed("ui.refresh_from_scene")
     def refresh_from_scene(self):
-        changed = False
+        scan = None
+        if hasattr(mu, "scan_material_assignments"):
+            try: scan = mu.scan_material_assignments(list(self.lib_index.by_name))
+            except Exception: scan = None
         for mats in self.lib_data.values():
             for m in mats:
-                before = list(m.get("assets", []))
-                self._merge_scene_assets(m)
-                after = m.get("assets", [])
-                if before != after:
-                    changed = True
-                    card = self._card_index.get(id(m))
-                    if card: card.refresh()
-        if changed:
-            self._refresh_tree()
+                if self._merge_scene_assets(m, scan):
+                    self._update_card(m)
+
+    # scene assignment tracking: DG callbacks only record what changed, the
+    # debounce timer then updates just the materials involved
+    @staticmethod
+    def _no_scene_events():
+        return {"ses": set(), "mats": set(), "renamed": [], "removed": set(), "full": False}
+
+    def _watch_scene(self):
+        if hasattr(mu, "watch_scene_assignments"):
+            self._scene_cb = mu.watch_scene_assignments(self._on_scene_members, self._on_scene_renamed, self._on_scene_removed)
+        if self._scene_cb is None and cmds:
+            # no OpenMaya: coarse scriptJobs, each answered by one full sweep. They
+            # catch renames, new objects and set membership (assignments); a shader
+            # swapped into an existing shading group waits for the next refresh.
+            for ev in ("NameChanged", "DagObjectCreated", "SetModified", "Undo", "Redo"):
+                try: self._scriptjobs.append(cmds.scriptJob(e=[ev, self._on_scene_any], p=self.objectName()))
+                except Exception: pass
+
+    def _on_scene_members(self, se, src):
+        self._scene_events["ses"].add(se)
+        if src in self.lib_index.by_name: self._scene_events["mats"].add(src)
+        self._scene_timer.start()
+
+    def _on_scene_renamed(self, old, new, handle=None):
+        self._scene_events["renamed"].append((old, new, handle)); self._scene_timer.start()
+
+    def _on_scene_removed(self, node):
+        self._scene_events["removed"].add(node); self._scene_timer.start()
+
+    def _on_scene_any(self, *args):
+        self._scene_events["full"] = True; self._scene_timer.start()
+
+    def _apply_scene_events(self):
+        ev, self._scene_events = self._scene_events, self._no_scene_events()
+        if not cmds: return
+        if ev["full"]:
+            self.refresh_from_scene(); return
+        idx, touched = self.lib_index, {}
+
+        # the library entry follows its own Maya node (the handle its network watch
+        # recorded), not whichever node last carried the same name
+        nodes = {}
+        if ev["renamed"]:
+            for mid, h in self._graph_node.items():
+                nodes.setdefault(h.hashCode(), []).append((mid, h))
+        for old, new, handle in ev["renamed"]:
+            if handle is not None and old != new:
+                for mid, h in nodes.get(handle.hashCode(), []):
+                    m = idx.get(mid)
+                    if m is None or not h.isValid() or h != handle or m.get("name") == new: continue
+                    prev = m.get("name", ""); m["name"] = new; idx.rename(m, prev)
+                    self._mark_dirty(m); self.tree_model.material_changed(m)
+                    self._update_card(m, new)
+            for m in idx.rename_asset(old, new): touched[m["id"]] = m
+
+        gone = [n for n in ev["removed"] if n in idx.by_asset and not cmds.objExists(n)]
+        for n in gone:
+            for m in idx.materials_with(n):
+                idx.unlink(m, [n]); touched[m["id"]] = m
+
+        names = set(ev["mats"])
+        ses = (cmds.ls(list(ev["ses"]), type="shadingEngine") or []) if ev["ses"] else []
+        if ses:
+            names.update(n for n in cmds.listConnections(ses, s=True, d=False) or [] if n in idx.by_name)
+        if names:
+            try: scan = mu.scan_material_assignments(list(names))
+            except Exception: scan = {}
+            for name, mid in [(n, mid) for n in names for mid in idx.ids_for_name(n)]:
+                m = idx.get(mid)
+                if m is None: continue
+                objs = scan.get(name) or []
+                changed = idx.link(m, objs)
+                keep = set(objs)
+                stale = [o for o in m.get("assets", []) if o not in keep]
+                if stale:
+                    # drop only objects that still exist (now assigned elsewhere)
+                    changed += idx.unlink(m, cmds.ls(stale) or [])
+                if changed: touched[m["id"]] = m
+
+        if touched:
+            self._index_dirty = True
+            for m in touched.values(): self._update_card(m)
 
     def _try_load(self):
         if not self._json_path or not os.path.isfile(self._json_path): return
         try:
-            with open(self._json_path, "r", encoding="utf-8") as f:
-                self.lib_data = json.load(f)
-            for mats in self.lib_data.values():
-                for m in mats:
-                    m.setdefault("assets", []); m.setdefault("thumb_b64","")
+            self._open_store(self._json_path)
         except Exception as e:
             self._warn("Load failed", str(e))
         max_f = 0
@@ -1148,6 +2055,10 @@ class MaterialLibraryDialog(QtWidgets.QDialog):
         self._refresh_tree()
 
     def closeEvent(self, e):
+        self._unwatch_all()
+        mu.remove_callbacks(self._scene_cb); self._scene_cb = None; self._scene_timer.stop()
+        try: mq.THUMB_CACHE.signals().ready.disconnect(self._on_thumb_ready)
+        except Exception: pass
         try:
             for j in getattr(self, "_scriptjobs", []):
                 try: cmds.scriptJob(kill=j, force=True)
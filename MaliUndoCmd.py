@@ -0,0 +1,62 @@
+
+import sys
+import maya.api.OpenMaya as om
+
+
+# Maya plugin: MLI_applyModifier <module>. OpenMaya MDGModifier.doIt() called
+# from a script never reaches the undo queue; the caller puts a prepared
+# modifier in <module>.PENDING_MODIFIERS and runs this command, so the whole
+# batch is one undo entry. Maya imports this file as a module of its own, so
+# the queue lives with the caller, named by the argument. The result is True
+# when a modifier was applied.
+
+maya_useNewAPI = True
+
+COMMAND = "MLI_applyModifier"
+
+
+class ApplyModifier(om.MPxCommand):
+
+    def __init__(self):
+        super().__init__()
+        self.mod = None
+
+    @staticmethod
+    def creator():
+        return ApplyModifier()
+
+    @staticmethod
+    def syntax():
+        s = om.MSyntax()
+        s.addArg(om.MSyntax.kString)
+        return s
+
+    def doIt(self, args):
+        owner = sys.modules.get(args.asString(0)) if len(args) else None
+        queue = getattr(owner, "PENDING_MODIFIERS", None)
+        self.mod = queue.pop() if queue else None
+        if self.mod is not None:
+            self.redoIt()
+        self.setResult(self.mod is not None)
+
+    def redoIt(self):
+        try:
+            self.mod.doIt()
+        except Exception:
+            try: self.mod.undoIt()
+            except Exception: pass
+            raise
+
+    def undoIt(self):
+        self.mod.undoIt()
+
+    def isUndoable(self):
+        return self.mod is not None
+
+
+def initializePlugin(obj):
+    om.MFnPlugin(obj, "MaterialLibrary", "1.1").registerCommand(COMMAND, ApplyModifier.creator, ApplyModifier.syntax)
+
+
+def uninitializePlugin(obj):
+    om.MFnPlugin(obj).deregisterCommand(COMMAND)
@@ -1,15 +1,26 @@
 
+import os, base64, re, shutil, hashlib, threading
+from contextlib import contextmanager
+
 try:
-    from PySide6 import QtCore, QtGui, QtWidgets
+    import maya.cmds as cmds
 except Exception:
-    from PySide2 import QtCore, QtGui, QtWidgets
+    cmds = None
 
-import os, base64, re
+try:
+    import maya.api.OpenMaya as om
+except Exception:
+    om = None
 
 try:
-    import maya.cmds as cmds
+    from . import MaliStore as ms  # type: ignore
 except Exception:
-    cmds = None
+    import MaliStore as ms
+try:
+    from . import MaliProfile as mp  # type: ignore
+except Exception:
+    import MaliProfile as mp
+mp.watch_cmds(__name__)
 
 
 def selected_materials():
@@ -54,6 +65,7 @@ def get_shading_engine(material):
     return ses[0] if ses else None
 
 
+@mp.timed("util.objects_using_material")
 def objects_using_material(material, unique_parents=True):
     
     if not cmds:
@@ -76,6 +88,57 @@ def objects_using_material(material, unique_parents=True):
     return result
 
 
+def _parents_of(shapes):
+    # shape -> parent transform, resolved through the API (no cmds round trip) when OpenMaya is there
+    out = {}
+    if om:
+        for s in shapes:
+            try:
+                path = om.MSelectionList().add(s).getDagPath(0); path.pop()
+                out[s] = path.partialPathName()
+            except Exception:
+                pass
+    for s in shapes:
+        if s not in out:
+            out[s] = (cmds.listRelatives(s, p=True) or [None])[0]
+    return out
+
+
+@mp.timed("util.scan_material_assignments")
+def scan_material_assignments(materials=None):
+    # One sweep over every shadingEngine: {material: [transforms]}.
+    # Same answer as objects_using_material() per material, but the Maya call
+    # count depends on the number of shading groups, not materials x members.
+    if not cmds:
+        return {}
+    ses = cmds.ls(type="shadingEngine") or []
+    if not ses:
+        return {}
+    pairs = cmds.listConnections(ses, c=True, s=True, d=False) or []
+    srcs = set(pairs[1::2])
+    wanted = srcs & set(materials) if materials is not None else set(cmds.ls(list(srcs), materials=True) or [])
+
+    se_mats = {}
+    for plug, src in zip(pairs[::2], pairs[1::2]):
+        if src in wanted:
+            mats = se_mats.setdefault(plug.split(".", 1)[0], [])
+            if src not in mats: mats.append(src)
+
+    se_members, nodes = {}, set()
+    for se in se_mats:
+        members = [m.split(".", 1)[0] for m in cmds.sets(se, q=True) or []]   # components -> node
+        se_members[se] = members; nodes.update(members)
+    transforms = set(cmds.ls(list(nodes), type="transform") or []) if nodes else set()
+    parents = _parents_of([n for n in nodes if n not in transforms])
+
+    result = {}
+    for se, mats in se_mats.items():
+        objs = [n if n in transforms else parents.get(n) for n in se_members[se]]
+        for mat in mats:
+            result.setdefault(mat, {}).update((t, None) for t in objs if t)
+    return {mat: list(objs) for mat, objs in result.items()}
+
+
 def select_objects_from_material(material):
     
     if not cmds:
@@ -179,84 +242,16 @@ def select_objects_by_names(names):
     return objs
 
 
-
-
-def qicon_from_b64(b64str):
-    
-    if not b64str:
-        return QtGui.QIcon()
-    try:
-        ba = QtCore.QByteArray.fromBase64(QtCore.QByteArray(b64str.encode("utf-8")))
-        pm = QtGui.QPixmap(); pm.loadFromData(ba)
-        return QtGui.QIcon(pm) if not pm.isNull() else QtGui.QIcon()
-    except Exception:
-        return QtGui.QIcon()
-
-
-class ImagePreview(QtWidgets.QLabel):
-    
-    def __init__(self, w=200, h=160, parent=None, radius=90):
-        super().__init__(parent)
-        self.setMinimumSize(w, h)
-        self.setAlignment(QtCore.Qt.AlignCenter)
-        self.setStyleSheet("background: transparent;")
-        self._b64 = ""
-        self._pm  = QtGui.QPixmap()
-        self._radius = int(radius)
-        self._bg_col = QtGui.QColor("#2b2b2b")
-        self._border_col = QtGui.QColor("#555555")
-
-    def set_image_b64(self, b64str):
-        self._b64 = b64str or ""
-        self._pm = QtGui.QPixmap()
-        if self._b64:
-            try:
-                ba = QtCore.QByteArray.fromBase64(QtCore.QByteArray(self._b64.encode("utf-8")))
-                self._pm.loadFromData(ba)
-            except Exception:
-                pass
-        self.update()
-
-    def paintEvent(self, e):
-        p = QtGui.QPainter(self); p.setRenderHint(QtGui.QPainter.Antialiasing, True)
-        rect = self.rect().adjusted(1, 1, -1, -1)
-        path = QtGui.QPainterPath(); r = float(self._radius)
-        path.addRoundedRect(QtCore.QRectF(rect), r, r)
-        p.fillPath(path, self._bg_col)
-        if not self._pm.isNull():
-            p.save(); p.setClipPath(path)
-            scaled = self._pm.scaled(rect.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
-            x = rect.x() + (rect.width()-scaled.width())*0.5
-            y = rect.y() + (rect.height()-scaled.height())*0.5
-            p.drawPixmap(int(x), int(y), scaled); p.restore()
-        else:
-            p.setPen(QtGui.QPen(QtGui.QColor("#aaaaaa")))
-            p.drawText(rect, QtCore.Qt.AlignCenter, "No Preview")
-        pen = QtGui.QPen(self._border_col); pen.setWidth(1); p.setPen(pen); p.drawPath(path); p.end()
-
-    def resizeEvent(self, e):
-        super().resizeEvent(e); self.update()
-
-
-def pick_image_to_base64(parent=None):
-    
-    filters = "Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff)"
-    path, _ = QtWidgets.QFileDialog.getOpenFileName(parent, "Choose Image", "", filters)
-    if not path:
-        return "", ""
-    with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    return b64, path
-
-
 #
 _SKIP_ATTR_PATTERNS = (
     r'^message$', r'^isHistoricallyInteresting$', r'^caching$', r'^blackBox$',
     r'^nodeState$', r'^binMembership$', r'^uuid$', r'^hasBrush$', r'^drawOverride\..*',
 )
 
+_SKIP_ATTR_RE = re.compile("|".join(_SKIP_ATTR_PATTERNS))
+
 def _skip_attr(attr_name: str) -> bool:
-    return any(re.match(p, attr_name) for p in _SKIP_ATTR_PATTERNS)
+    return _SKIP_ATTR_RE.match(attr_name) is not None
 
 
 def _safe_list(value):
@@ -273,37 +268,202 @@ def _all_upstream_nodes(mat):
         if n in seen:
             continue
         seen.add(n)
+        out.append(n)
+    try:
+        dag = set(cmds.ls(out, type="dagNode") or [])
+    except Exception:
+        dag = set()
+    return [n for n in out if n not in dag]
+
+
+def _node_types(nodes):
+    
+    try:
+        flat = cmds.ls(nodes, showType=True) or []
+        return dict(zip(flat[0::2], flat[1::2]))
+    except Exception:
+        out = {}
+        for n in nodes:
+            try: out[n] = cmds.nodeType(n)
+            except Exception: pass
+        return out
+
+
+# ---- per node-type attribute schema (built once per type per session) ----
+# {"types": {attr: type}, "cmds": [attr, ...], "api": [entry, ...], "static": n}
+_TYPE_SCHEMAS = {}
+_API_NUMERIC_TYPES = {}
+
+_TYPE_DEFAULTS = {}
+
+def clear_type_schemas():
+    _TYPE_SCHEMAS.clear()
+    _TYPE_DEFAULTS.clear()
+
+
+def _api_numeric_types():
+    if not _API_NUMERIC_TYPES and om:
+        for k, atype, getter in (
+            ("kBoolean", "bool", "asBool"),    ("kByte", "byte", "asInt"),       ("kChar", "char", "asInt"),
+            ("kShort", "short", "asInt"),      ("kInt", "long", "asInt"),        ("kInt64", "long", "asInt"),
+            ("kFloat", "float", "asFloat"),    ("kDouble", "double", "asDouble"),
+            ("k2Float", "float2", "asFloat"),  ("k2Double", "double2", "asDouble"), ("k2Int", "long2", "asInt"),
+            ("k3Float", "float3", "asFloat"),  ("k3Double", "double3", "asDouble"), ("k3Int", "long3", "asInt"),
+        ):
+            if hasattr(om.MFnNumericData, k):
+                _API_NUMERIC_TYPES[getattr(om.MFnNumericData, k)] = (atype, getter)
+    return _API_NUMERIC_TYPES
+
+
+def _in_array(fa):
+    p = fa.parent
+    while not p.isNull():
+        fp = om.MFnAttribute(p)
+        if fp.array:
+            return True
+        p = fp.parent
+    return False
+
+
+def _api_attr_entry(attr, node):
+    # (name, attribute MObject, type, reader) or None when never captured
+    fa = om.MFnAttribute(attr)
+    name = fa.name
+    if not fa.writable or not fa.storable or fa.array or _skip_attr(name):
+        return None
+    if attr.hasFn(om.MFn.kMessageAttribute) or _in_array(fa):
+        return None
+    if attr.hasFn(om.MFn.kNumericAttribute):
+        atype, getter = _api_numeric_types().get(om.MFnNumericAttribute(attr).numericType(), (None, None))
+        return (name, attr, atype, getter) if atype else None
+    if attr.hasFn(om.MFn.kEnumAttribute):
+        return (name, attr, "enum", "enum")
+    if attr.hasFn(om.MFn.kUnitAttribute):
+        U = om.MFnUnitAttribute
+        reader = {U.kDistance: ("doubleLinear", "distance"), U.kAngle: ("doubleAngle", "angle"),
+                  U.kTime: ("time", "time")}.get(om.MFnUnitAttribute(attr).unitType())
+        return (name, attr) + reader if reader else None
+    if attr.hasFn(om.MFn.kTypedAttribute) and om.MFnTypedAttribute(attr).attrType() == om.MFnData.kString:
+        return (name, attr, "string", "string")
+    if attr.hasFn(om.MFn.kCompoundAttribute):
+        return None
+    # exotic data (matrices, meshes...): typed once here, read through cmds
+    try:
+        return (name, attr, cmds.getAttr(f"{node}.{name}", type=True), "cmds")
+    except Exception:
+        return None
+
+
+def _build_schema_api(node):
+    sel = om.MSelectionList(); sel.add(node)
+    fn = om.MFnDependencyNode(sel.getDependNode(0))
+    entries, static = [], 0
+    for i in range(fn.attributeCount()):
+        attr = fn.attribute(i)
+        if om.MFnAttribute(attr).dynamic:
+            continue
+        static += 1
+        e = _api_attr_entry(attr, node)
+        if e: entries.append(e)
+    return {"types": {e[0]: e[2] for e in entries}, "api": entries, "static": static}
+
+
+def _settable_attrs(node):
+    atts = [a for a in (cmds.listAttr(node, settable=True) or []) if not _skip_attr(a)]
+    types = {}
+    for a in atts:
+        try: types[a] = cmds.getAttr(f"{node}.{a}", type=True)
+        except Exception: types[a] = None
+    return {"types": types, "cmds": atts}
+
+
+def _build_schema_cmds(node, ntype=None):
+    # listAttr(settable=True) leaves out connected / locked plugs, so the per-type
+    # schema comes from a pristine node; node itself only when one can't be made
+    try:
+        with _scratch_node(ntype or cmds.nodeType(node)) as tmp:
+            return _settable_attrs(tmp)
+    except Exception:
+        return _settable_attrs(node)
+
+
+def _type_schema(ntype, node):
+    sch = _TYPE_SCHEMAS.get(ntype)
+    if sch is None:
+        if om:
+            try: sch = _build_schema_api(node)
+            except Exception: sch = None
+        if sch is None:
+            sch = _build_schema_cmds(node, ntype)
+        _TYPE_SCHEMAS[ntype] = sch
+    return sch
+
+
+# ---- attribute capture: OpenMaya (one pass per node) ----
+def _api_read(plug, node, name, reader):
+    if reader == "enum":     return plug.asShort()
+    if reader == "string":   return plug.asString()
+    if reader == "distance": return plug.asMDistance().asUnits(om.MDistance.uiUnit())
+    if reader == "angle":    return plug.asMAngle().asUnits(om.MAngle.uiUnit())
+    if reader == "time":     return plug.asMTime().asUnits(om.MTime.uiUnit())
+    if reader == "cmds":     return _safe_list(cmds.getAttr(f"{node}.{name}"))
+    if plug.isCompound:
+        return [getattr(plug.child(i), reader)() for i in range(plug.numChildren())]
+    return getattr(plug, reader)()
+
+
+def _node_attrs_dump_api(node, schema):
+    
+    sel = om.MSelectionList(); sel.add(node)
+    fn = om.MFnDependencyNode(sel.getDependNode(0))
+    entries = schema["api"]
+    if fn.attributeCount() > schema["static"]:
+        # per-node dynamic attributes are not part of the type schema
+        entries = list(entries)
+        for i in range(fn.attributeCount()):
+            attr = fn.attribute(i)
+            if om.MFnAttribute(attr).dynamic:
+                e = _api_attr_entry(attr, node)
+                if e: entries.append(e)
+
+    data = {}
+    for name, attr, atype, reader in entries:
+        plug = fn.findPlug(attr, False)
+        if plug.isDestination or plug.isLocked:
+            continue
         try:
-            if cmds.objectType(n, isAType="dagNode"):
-                
-                continue
+            val = _api_read(plug, node, name, reader)
         except Exception:
-            pass
-        out.append(n)
-    return out
+            continue
+        data[name] = {"name": name, "value": val, "type": atype}
+    return data
 
 
-def _node_attrs_dump(node):
+# ---- attribute capture: maya.cmds fallback ----
+def _node_attrs_dump_cmds(node, schema):
     
     data = {}
-    atts = cmds.listAttr(node, settable=True) or []
+    types = schema["types"]
+    atts = list(schema["cmds"])
+    atts += [a for a in (cmds.listAttr(node, userDefined=True, settable=True) or [])
+             if a not in types and not _skip_attr(a)]
+    conns = cmds.listConnections(node, s=True, d=False, c=True, p=True) or []
+    connected = set(conns[0::2])
     for a in atts:
-        if _skip_attr(a):
-            continue
         plug = f"{node}.{a}"
+        if plug in connected:
+            continue
         try:
-            if cmds.connectionInfo(plug, isDestination=True):
-                
-                continue
             val = cmds.getAttr(plug)
         except Exception:
             continue
 
-        payload = {"name": a, "value": _safe_list(val), "type": None}
-        try:
-            payload["type"] = cmds.getAttr(plug, type=True)
-        except Exception:
-            pass
+        payload = {"name": a, "value": _safe_list(val), "type": types.get(a)}
+        if a not in types:
+            try:
+                payload["type"] = cmds.getAttr(plug, type=True)
+            except Exception:
+                pass
 
         
         if payload["type"] in ("double3","float3") and isinstance(payload["value"], list):
@@ -314,19 +474,79 @@ def _node_attrs_dump(node):
     return data
 
 
-def _node_connections_dump(nodes_set):
+def _node_attrs_dump(node, ntype=None):
     
-    conns = set()
-    for n in nodes_set:
+    schema = _type_schema(ntype or cmds.nodeType(node), node)
+    if "api" in schema:
         try:
-            plugs = cmds.listConnections(n, c=True, p=True, s=True, d=True) or []
+            return _node_attrs_dump_api(node, schema)
         except Exception:
-            continue
-        for i in range(0, len(plugs), 2):
-            dstPlug, srcPlug = plugs[i], plugs[i+1]  
-            srcNode = srcPlug.split('.')[0]
-            if dstNode in nodes_set and srcNode in nodes_set:
-                conns.add((srcPlug, dstPlug))
+            pass
+    if "cmds" not in schema:
+        schema.update(_build_schema_cmds(node, ntype))
+    return _node_attrs_dump_cmds(node, schema)
+
+
+# ---- per node-type default values (for sparse snapshots) ----
+@contextmanager
+def _scratch_node(ntype):
+    # a fresh, unconnected node of ntype, created and deleted outside the undo queue
+    tmp = None
+    try:
+        undo = cmds.undoInfo(q=True, stateWithoutFlush=True)
+    except Exception:
+        undo = None
+    try:
+        if undo: cmds.undoInfo(stateWithoutFlush=False)
+        tmp = cmds.createNode(ntype, skipSelect=True)
+        yield tmp
+    finally:
+        if tmp:
+            try: cmds.delete(tmp)
+            except Exception: pass
+        if undo: cmds.undoInfo(stateWithoutFlush=True)
+
+
+def _type_defaults(ntype):
+    
+    d = _TYPE_DEFAULTS.get(ntype)
+    if d is not None:
+        return d
+    try:
+        with _scratch_node(ntype) as tmp:
+            d = {a: p.get("value") for a, p in _node_attrs_dump(tmp, ntype).items()}
+    except Exception:
+        d = {}
+    _TYPE_DEFAULTS[ntype] = d
+    return d
+
+
+def _same_value(a, b, tol=1e-6):
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(_same_value(x, y, tol) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        try: return abs(float(a) - float(b)) <= tol
+        except Exception: return False
+    return a == b
+
+
+def _sparse_attrs(attrs, defaults):
+    return {a: p for a, p in attrs.items()
+            if a not in defaults or not _same_value(p.get("value"), defaults[a])}
+
+
+def _node_connections_dump(nodes_set):
+    
+    # one query for every incoming connection of the network
+    try:
+        plugs = cmds.listConnections(list(nodes_set), c=True, p=True, s=True, d=False) or []
+    except Exception:
+        plugs = []
+    conns = set()
+    for i in range(0, len(plugs) - 1, 2):
+        dstPlug, srcPlug = plugs[i], plugs[i+1]
+        if dstPlug.split('.')[0] in nodes_set and srcPlug.split('.')[0] in nodes_set:
+            conns.add((srcPlug, dstPlug))
     return [{"src": s, "dst": d} for (s, d) in sorted(conns)]
 
 
@@ -345,41 +565,142 @@ def _collect_file_embeds(node):
             pass
 
         if path and os.path.exists(path):
-            with open(path, "rb") as f:
-                info["b64"] = base64.b64encode(f.read()).decode("utf-8")
+            # bytes go to the library's blob store on save, not into the snapshot
             info["name"] = os.path.basename(path)
     except Exception:
         pass
     return info
 
 
-def capture_material_network(material):
+@mp.timed("util.capture_material_network")
+def capture_material_network(material, sparse=True):
     
+    # sparse: keep only attributes that differ from the node type's defaults;
+    # rebuilt nodes start at those defaults, so nothing is lost
     if not cmds or not cmds.objExists(material):
         return {}
     nodes = _all_upstream_nodes(material)
     nodes_set = set(nodes)
 
+    types = _node_types(nodes)
     out_nodes = {}
     for n in nodes:
-        try:
-            ntype = cmds.nodeType(n)
-        except Exception:
+        ntype = types.get(n)
+        if not ntype:
             continue
-        spec = {"type": ntype, "attrs": _node_attrs_dump(n)}
+        attrs = _node_attrs_dump(n, ntype)
+        if sparse:
+            attrs = _sparse_attrs(attrs, _type_defaults(ntype))
+        spec = {"type": ntype, "attrs": attrs}
         if ntype == "file":
             spec["embed"] = _collect_file_embeds(n)
         out_nodes[n] = spec
 
     connections = _node_connections_dump(nodes_set)
-    return {"material": material, "nodes": out_nodes, "connections": connections}
+    snap = {"material": material, "nodes": out_nodes, "connections": connections}
+    if sparse:
+        snap["sparse"] = True
+    return snap
+
+
+# Change tracking (DG callbacks)
+
+def _graph_edit_mask():
+    M = om.MNodeMessage
+    return (M.kAttributeSet | M.kConnectionMade | M.kConnectionBroken |
+            M.kAttributeAdded | M.kAttributeRemoved | M.kAttributeArrayRemoved)
 
 
-def _unique_name_like(base):
+def watch_material_network(material, callback):
+    # (callback ids, MObjectHandle of the material node): the handle follows the
+    # node through renames, watch_scene_assignments reports it with each rename
+    if not om or not cmds or not material or not cmds.objExists(material):
+        return None
+    sel = om.MSelectionList()
+    for n in _all_upstream_nodes(material):
+        try: sel.add(n)
+        except Exception: pass
+    mask = _graph_edit_mask()
+
+    def _on_attr(msg, *_):
+        if msg & mask:
+            callback()
+
+    ids = []
+    for i in range(sel.length()):
+        try: ids.append(om.MNodeMessage.addAttributeChangedCallback(sel.getDependNode(i), _on_attr))
+        except Exception: pass
+    try:
+        one = om.MSelectionList(); one.add(material)
+        handle = om.MObjectHandle(one.getDependNode(0))
+    except Exception:
+        handle = None
+    return ids, handle
+
+
+def _file_io_busy():
+    try:
+        F = om.MFileIO
+        return F.isOpeningFile() or F.isNewingFile() or F.isReadingFile()
+    except Exception:
+        return False
+
+
+def watch_scene_assignments(on_members, on_renamed, on_removed):
+    # Scene-wide callbacks that keep library asset lists current:
+    #   on_members(shading_engine, source_node)  a shadingEngine connection changed
+    #                                            (set membership or its shader)
+    #   on_renamed(old, new, handle)             any DG node was renamed (its MObjectHandle)
+    #   on_removed(transform)                    a transform is being deleted
+    # They only record; callers coalesce the work. None without OpenMaya.
+    if not om or not cmds:
+        return None
+
+    def _on_conn(src, dst, made, *_):
+        try:
+            node = dst.node()
+            if node.hasFn(om.MFn.kShadingEngine) and not _file_io_busy():
+                on_members(om.MFnDependencyNode(node).name(), om.MFnDependencyNode(src.node()).name())
+        except Exception:
+            pass
+
+    def _on_name(node, prev, *_):
+        try:
+            if prev and not _file_io_busy():
+                on_renamed(prev, om.MFnDependencyNode(node).name(), om.MObjectHandle(node))
+        except Exception:
+            pass
+
+    def _on_removed(node, *_):
+        try:
+            if not _file_io_busy():
+                on_removed(om.MFnDependencyNode(node).name())
+        except Exception:
+            pass
+
+    ids = []
+    for add in (lambda: om.MDGMessage.addConnectionCallback(_on_conn),
+                lambda: om.MNodeMessage.addNameChangedCallback(om.MObject(), _on_name),
+                lambda: om.MDGMessage.addNodeRemovedCallback(_on_removed, "transform")):
+        try: ids.append(add())
+        except Exception: pass
+    return ids
+
+
+def remove_callbacks(ids):
+    if not om:
+        return
+    for cid in ids or []:
+        try: om.MMessage.removeCallback(cid)
+        except Exception: pass
+
+
+def _unique_name(base, taken):
     
     i, name = 2, base
-    while cmds.objExists(name):
+    while name in taken:
         name = f"{base}_{i}"; i += 1
+    taken.add(name)
     return name
 
 
@@ -397,125 +718,480 @@ def _ensure_sourceimages():
     return src
 
 
-def _write_embed_to_disk(embed):
+class _TextureDir(object):
+    # Cached view of a sourceimages folder: taken names, files bucketed by size
+    # and lazily computed content hashes, so an embed whose bytes already sit
+    # in the folder is reused instead of written again as name_2.png.
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.names, self.sizes, self.stats = set(), {}, {}
+        self.digests = {}       # file name -> (size, mtime_ns, sha1)
+        self.writing = {}       # sha1 -> Event while one worker writes it
+        self.mtime = None
+
+    def _scan(self):
+        # lock held; re-list only when the folder changed behind us
+        try: mtime = os.stat(self.root).st_mtime_ns
+        except OSError: mtime = None
+        if mtime == self.mtime:
+            return
+        self.names, self.sizes, self.stats = set(), {}, {}
+        for e in os.scandir(self.root):
+            self.names.add(e.name.lower())
+            try:
+                if not e.is_file(): continue
+                st = e.stat()
+            except OSError:
+                continue
+            self.stats[e.name] = (st.st_size, st.st_mtime_ns)
+            self.sizes.setdefault(st.st_size, []).append(e.name)
+        self.mtime = mtime
+
+    def _digest_of(self, name, size):
+        # stat before trusting the cache: an in-place overwrite leaves the folder mtime alone
+        try: st = os.stat(os.path.join(self.root, name))
+        except OSError: return None
+        cur = (st.st_size, st.st_mtime_ns)
+        with self.lock:
+            old = self.stats.get(name)
+            if old != cur:
+                self.stats[name] = cur
+                if old and old[0] != cur[0]:
+                    bucket = self.sizes.get(old[0]) or []
+                    if name in bucket: bucket.remove(name)
+                    self.sizes.setdefault(cur[0], []).append(name)
+            known = self.digests.get(name)
+        if cur[0] != size:
+            return None
+        if known and known[:2] == cur:
+            return known[2]
+        try: d = ms.file_digest(os.path.join(self.root, name))
+        except OSError: return None
+        with self.lock:
+            self.digests[name] = cur + (d,)
+        return d
+
+    def _reserve(self, fname):
+        # lock held
+        base, ext = os.path.splitext(fname)
+        cand, i = fname, 1
+        while cand.lower() in self.names:
+            i += 1
+            cand = f"{base}_{i}{ext}"
+        self.names.add(cand.lower())
+        return os.path.join(self.root, cand)
+
+    def place(self, digest, size, fname, write):
+        # path of a file holding these bytes; write(f) runs only when none exists
+        while True:
+            with self.lock:
+                self._scan()
+                wait = self.writing.get(digest)
+                if wait is None:
+                    self.writing[digest] = threading.Event()
+                    same = sorted(self.sizes.get(size, ()), key=lambda n: n.lower() != fname.lower())
+            if wait is None:
+                break
+            wait.wait()
+        try:
+            for n in same:
+                if self._digest_of(n, size) == digest:
+                    return os.path.join(self.root, n)
+            for attempt in range(2):
+                with self.lock:
+                    if attempt: self.mtime = None; self._scan()
+                    fp = self._reserve(fname)
+                try:
+                    with open(fp, "xb") as f:
+                        write(f)
+                except FileExistsError:
+                    continue      # created behind our cached listing; re-list once
+                st = os.stat(fp)
+                name = os.path.basename(fp)
+                with self.lock:
+                    self.stats[name] = (st.st_size, st.st_mtime_ns)
+                    self.sizes.setdefault(st.st_size, []).append(name)
+                    self.digests[name] = (st.st_size, st.st_mtime_ns, digest)
+                    try: self.mtime = os.stat(self.root).st_mtime_ns
+                    except OSError: pass
+                return fp
+            return None
+        finally:
+            with self.lock:
+                self.writing.pop(digest).set()
+
+
+_TEXTURE_DIRS = {}
+_TEXTURE_DIRS_LOCK = threading.Lock()
+
+def _texture_dir(root):
     
-    if not embed or not embed.get("b64"):
-        return None
-    dst_dir = _ensure_sourceimages()
-    fname = embed.get("name") or "tex.png"
-    base, ext = os.path.splitext(os.path.join(dst_dir, fname))
-    fp, i = base + ext, 1
-    while os.path.exists(fp):
-        i += 1
-        fp = f"{base}_{i}{ext}"
-    with open(fp, "wb") as f:
-        f.write(base64.b64decode(embed["b64"]))
-    return fp
+    key = os.path.normcase(os.path.abspath(root))
+    with _TEXTURE_DIRS_LOCK:
+        if key not in _TEXTURE_DIRS:
+            _TEXTURE_DIRS[key] = _TextureDir(root)
+        return _TEXTURE_DIRS[key]
 
 
-def rebuild_material_network(snapshot: dict, new_material_name: str = None, namespace: str = "MLI"):
+def _write_embed_to_disk(embed, blob_store=None, dst_dir=None):
     
-    if not cmds or not snapshot:
-        return ""
+    if not embed:
+        return None
+    blob = embed.get("blob")
+    if embed.get("b64"):
+        data = base64.b64decode(embed["b64"])
+        digest, size = hashlib.sha1(data).hexdigest(), len(data)
+        write = lambda f: f.write(data)
+    elif blob and blob_store and blob_store.has(blob):
+        src = blob_store.key_path(blob)
+        digest, size = blob[:40], os.path.getsize(src)      # blob keys are sha1 + ext
+        def write(f):
+            with open(src, "rb") as fh:
+                shutil.copyfileobj(fh, f, 1 << 20)
+    else:
+        return None
+    dst_dir = dst_dir or _ensure_sourceimages()
+    # the name comes from the library: keep its base name only
+    fname = os.path.basename((embed.get("name") or "").replace("\\", "/")) or "tex.png"
+    return _texture_dir(dst_dir).place(digest, size, fname, write)
 
-    nodes = snapshot.get("nodes") or {}
-    conns = snapshot.get("connections") or []
-    mat_old = snapshot.get("material") or ""
 
-    rename_map = {}
-    for old, spec in nodes.items():
-        ntype = spec.get("type")
+def materialize_embeds(snapshot: dict, blob_store=None, dst_dir=None):
+    
+    # queues every embedded texture of the snapshot on the I/O pool and returns
+    # {file node: Future[path]}; never touches maya.cmds, so it is safe to call
+    # from a worker thread (pass dst_dir from _ensure_sourceimages())
+    dst_dir = dst_dir or _ensure_sourceimages()
+    out = {}
+    for n, spec in ((snapshot or {}).get("nodes") or {}).items():
+        emb = spec.get("embed") if spec.get("type") == "file" else None
+        if emb and (emb.get("b64") or emb.get("blob")):
+            out[n] = ms.io_pool().submit(_write_embed_to_disk, emb, blob_store, dst_dir)
+    return out
 
-        
-        if old == mat_old and new_material_name:
-            new = _unique_name_like(new_material_name)
-        else:
-            base = f"{namespace}_{old}" if cmds.objExists(old) else old
-            new = _unique_name_like(base)
 
-        
+# ---- rebuild engine: plan everything, then apply in one batch ----
+_CLASS_LISTS = (("shader/", "defaultShaderList1", "shaders"),
+                ("texture/", "defaultTextureList1", "textures"),
+                ("utility/", "defaultRenderUtilityList1", "utilities"))
+_TYPE_LIST = {}
+
+def _default_list_for(ntype):
+    
+    if ntype not in _TYPE_LIST:
+        found = None
         try:
-            if ntype.endswith("Surface"):
-                created = cmds.shadingNode(ntype, asShader=True, name=new)
-            else:
-                
-                created = cmds.createNode(ntype, name=new)
+            for c in cmds.getClassification(ntype) or []:
+                for part in c.split(":"):
+                    found = found or next(((n, a) for pre, n, a in _CLASS_LISTS if part.startswith(pre)), None)
         except Exception:
-            try:
-                created = cmds.createNode(ntype, name=new)
-            except Exception:
+            pass
+        _TYPE_LIST[ntype] = found
+    return _TYPE_LIST[ntype]
+
+
+class RebuildResult(object):
+    
+    def __init__(self):
+        self.materials = []     # new material name per job, "" when it could not be built
+        self.rename_maps = []   # old node name -> new node name, per job
+        self.failed = []        # (node or plug, reason)
+
+
+def _plan_rebuild(jobs, namespace, blob_store, result):
+    
+    taken = set(cmds.ls() or [])
+    existing = set(taken)
+    plan = {"nodes": [], "values": [], "conns": [], "shading": []}
+    for job in jobs:
+        snapshot, new_material_name = job[0], job[1]
+        textures = job[2] if len(job) > 2 else None    # old file node -> path or Future[path]
+        nodes = (snapshot or {}).get("nodes") or {}
+        mat_old = (snapshot or {}).get("material") or ""
+        rename_map = {}
+        for old, spec in nodes.items():
+            ntype = spec.get("type")
+            if not ntype:
                 continue
+            if old == mat_old and new_material_name:
+                new = _unique_name(new_material_name, taken)
+            else:
+                new = _unique_name(f"{namespace}_{old}" if old in existing else old, taken)
+            rename_map[old] = new
+            plan["nodes"].append((new, ntype))
+
+            known = (_TYPE_SCHEMAS.get(ntype) or {}).get("types")
+            for payload in (spec.get("attrs") or {}).values():
+                a = payload["name"]
+                if payload.get("value") is None or (known is not None and a not in known):
+                    continue
+                plan["values"].append((new, a, payload["value"], payload.get("type") or (known or {}).get(a)))
+
+            if ntype == "file":
+                emb = spec.get("embed") or {}
+                path = (textures or {}).get(old)
+                if hasattr(path, "result"):
+                    try: path = path.result()
+                    except Exception as e:
+                        path = None; result.failed.append((f"{new}.fileTextureName", str(e)))
+                if not path and emb.get("path"):
+                    path = emb["path"]
+                if path:
+                    plan["values"].append((new, "fileTextureName", path, "string"))
+                if emb.get("colorSpace"):
+                    plan["values"].append((new, "colorSpace", emb["colorSpace"], "string"))
+
+        for c in (snapshot or {}).get("connections") or []:
+            s_old, d_old = c.get("src"), c.get("dst")
+            if not s_old or not d_old:
+                continue
+            s_node, s_attr = s_old.split('.', 1)
+            d_node, d_attr = d_old.split('.', 1)
+            if s_node in rename_map and d_node in rename_map:
+                plan["conns"].append((f"{rename_map[s_node]}.{s_attr}", f"{rename_map[d_node]}.{d_attr}"))
+
+        mat_new = rename_map.get(mat_old, "")
+        if mat_new:
+            plan["shading"].append((mat_new, _unique_name(f"{mat_new}SG", taken)))
+        result.materials.append(mat_new)
+        result.rename_maps.append(rename_map)
+    return plan
+
+
+def _api_set_value(mod, plug, val, atype):
+    
+    if atype in ("string", "cstring"):
+        mod.newPlugValueString(plug, str(val)); return True
+    if atype == "doubleLinear":
+        mod.newPlugValueMDistance(plug, om.MDistance(float(val), om.MDistance.uiUnit())); return True
+    if atype == "doubleAngle":
+        mod.newPlugValueMAngle(plug, om.MAngle(float(val), om.MAngle.uiUnit())); return True
+    if atype == "time":
+        mod.newPlugValueMTime(plug, om.MTime(float(val), om.MTime.uiUnit())); return True
+    setter = {"bool": mod.newPlugValueBool,
+              "byte": mod.newPlugValueInt, "char": mod.newPlugValueInt, "short": mod.newPlugValueShort,
+              "long": mod.newPlugValueInt, "enum": mod.newPlugValueShort,
+              "long2": mod.newPlugValueInt, "long3": mod.newPlugValueInt,
+              "float": mod.newPlugValueFloat, "float2": mod.newPlugValueFloat, "float3": mod.newPlugValueFloat,
+              "double": mod.newPlugValueDouble, "double2": mod.newPlugValueDouble,
+              "double3": mod.newPlugValueDouble}.get(atype)
+    if setter is None:
+        return False
+    cast = bool if atype == "bool" else float if atype.startswith(("float", "double")) else int
+    if plug.isCompound:
+        vals = list(val)
+        if len(vals) == 1 and isinstance(vals[0], (list, tuple)):
+            vals = list(vals[0])
+        for i in range(min(plug.numChildren(), len(vals))):
+            setter(plug.child(i), cast(vals[i]))
+    else:
+        setter(plug, cast(val))
+    return True
+
+
+def _scene_plug(name):
+    sel = om.MSelectionList(); sel.add(name)
+    return sel.getPlug(0)
+
+
+def _next_free_index(array_plug, used):
+    
+    key = array_plug.name()
+    if key not in used:
+        idx = array_plug.getExistingArrayAttributeIndices() or []
+        used[key] = (max(idx) + 1) if idx else 0
+    i = used[key]; used[key] += 1
+    return array_plug.elementByLogicalIndex(i)
+
+
+_UNDO_PLUGIN  = "MaliUndoCmd"
+_UNDO_COMMAND = "MLI_applyModifier"
+PENDING_MODIFIERS = []      # MLI_applyModifier <this module> pops its modifier from here
 
-        rename_map[old] = created
 
- 
-    for old, spec in nodes.items():
-        new = rename_map.get(old)
-        if not new:
+def _load_undo_plugin():
+    # raises when MaliUndoCmd.py can't be loaded; the rebuild then records why
+    if not cmds.pluginInfo(_UNDO_PLUGIN, q=True, loaded=True):
+        cmds.loadPlugin(os.path.join(os.path.dirname(os.path.abspath(__file__)), _UNDO_PLUGIN + ".py"), quiet=True)
+    if not hasattr(cmds, _UNDO_COMMAND):
+        raise RuntimeError("%s plugin did not register %s" % (_UNDO_PLUGIN, _UNDO_COMMAND))
+
+
+def _run_modifier(mod):
+    # one undoable command; it rolls the modifier back itself if doIt fails
+    PENDING_MODIFIERS[:] = [mod]
+    try:
+        applied = getattr(cmds, _UNDO_COMMAND)(__name__)
+    finally:
+        del PENDING_MODIFIERS[:]
+    if not applied:
+        raise RuntimeError("%s did not apply the modifier" % _UNDO_COMMAND)
+
+
+def _cmds_set_value(plug, val, atype):
+    if atype in ("string", "cstring"):
+        cmds.setAttr(plug, val, type="string")
+    elif atype in ("double3", "float3", "double2", "float2") and isinstance(val, (list, tuple)):
+        cmds.setAttr(plug, *val, type=atype)
+    else:
+        cmds.setAttr(plug, val)
+
+
+def _apply_plan_api(plan, result):
+    
+    _load_undo_plugin()
+    mod = om.MDGModifier()
+    objs, used, late = {}, {}, []
+    for name, ntype in plan["nodes"]:
+        try:
+            obj = mod.createNode(ntype)
+            mod.renameNode(obj, name)
+            objs[name] = obj
+        except Exception as e:
+            result.failed.append((name, "createNode %s: %s" % (ntype, e)))
             continue
-        for a, payload in (spec.get("attrs") or {}).items():
-            plug = f"{new}.{payload['name']}"
-            val, atype = payload.get("value"), payload.get("type")
-            if val is None:
-                continue
+        target = _default_list_for(ntype)
+        if target:
             try:
-                if atype in ("string", "cstring"):
-                    cmds.setAttr(plug, val, type="string")
-                elif atype in ("double3", "float3"):
-                    if isinstance(val, (list, tuple)) and len(val) == 3:
-                        
-                        try:
-                            cmds.setAttr(plug, *val, type=atype)
-                        except Exception:
-                            cmds.setAttr(plug, *val, type="double3")
-                else:
-                    cmds.setAttr(plug, val)
+                arr = _scene_plug("%s.%s" % target)
+                mod.connect(om.MFnDependencyNode(obj).findPlug("message", False), _next_free_index(arr, used))
             except Exception:
                 pass
 
-   
-        if spec.get("type") == "file":
-            emb = spec.get("embed") or {}
-            path = None
-            if emb.get("b64"):
-                path = _write_embed_to_disk(emb)
-            elif emb.get("path"):
-                path = emb["path"]
-            if path:
-                try:
-                    cmds.setAttr(new + ".fileTextureName", path, type="string")
-                except Exception:
-                    pass
-            if emb.get("colorSpace"):
-                try:
-                    cmds.setAttr(new + ".colorSpace", emb["colorSpace"], type="string")
-                except Exception:
-                    pass
+    def plug_of(node, attr):
+        return om.MFnDependencyNode(objs[node]).findPlug(attr, False)
+
+    for node, attr, val, atype in plan["values"]:
+        if node not in objs:
+            continue
+        plug = f"{node}.{attr}"
+        try:
+            if not _api_set_value(mod, plug_of(node, attr), val, atype):
+                late.append((node, attr, val, atype))     # by real name once the nodes exist
+        except Exception as e:
+            result.failed.append((plug, str(e)))
 
+    for src, dst in plan["conns"]:
+        try:
+            s_node, s_attr = src.split('.', 1); d_node, d_attr = dst.split('.', 1)
+            mod.connect(plug_of(s_node, s_attr), plug_of(d_node, d_attr))
+        except Exception as e:
+            result.failed.append((dst, "connect from %s: %s" % (src, e)))
+
+    for mat, sg_name in plan["shading"]:
+        if mat not in objs:
+            continue
+        try:
+            sg = mod.createNode("shadingEngine")
+            mod.renameNode(sg, sg_name)
+            objs[sg_name] = sg
+            mod.connect(plug_of(mat, "outColor"), plug_of(sg_name, "surfaceShader"))
+            mod.connect(plug_of(sg_name, "partition"), _next_free_index(_scene_plug("renderPartition.sets"), used))
+        except Exception as e:
+            result.failed.append((sg_name, str(e)))
+
+    _run_modifier(mod)
+
+    # Maya renames on a clash: read the names back instead of trusting the plan
+    real = {}
+    for name, obj in objs.items():
+        try: real[name] = om.MFnDependencyNode(obj).name()
+        except Exception: pass
+    for node, attr, val, atype in late:
+        if node not in real: continue
+        plug = f"{real[node]}.{attr}"
+        try: _cmds_set_value(plug, val, atype)
+        except Exception as e: result.failed.append((plug, str(e)))
+    result.materials = [real.get(m, "") for m in result.materials]
+    result.rename_maps = [{o: real[n] for o, n in rm.items() if n in real} for rm in result.rename_maps]
+
+
+def _apply_plan_cmds(plan, result):
     
-    for c in conns:
-        s_old, d_old = c.get("src"), c.get("dst")
-        if not s_old or not d_old:
+    created = {}
+    for name, ntype in plan["nodes"]:
+        target = _default_list_for(ntype)
+        try:
+            if target:
+                flag = {"defaultShaderList1": "asShader", "defaultTextureList1": "asTexture"}.get(target[0], "asUtility")
+                created[name] = cmds.shadingNode(ntype, name=name, **{flag: True})
+            else:
+                created[name] = cmds.createNode(ntype, name=name)
+        except Exception as e:
+            result.failed.append((name, "createNode %s: %s" % (ntype, e)))
+
+    for node, attr, val, atype in plan["values"]:
+        real = created.get(node)
+        if not real:
             continue
-        s_node, s_attr = s_old.split('.', 1)
-        d_node, d_attr = d_old.split('.', 1)
-        s_new, d_new = rename_map.get(s_node), rename_map.get(d_node)
-        if not s_new or not d_new:
+        plug = f"{real}.{attr}"
+        try:
+            _cmds_set_value(plug, val, atype)
+        except Exception as e:
+            result.failed.append((plug, str(e)))
+
+    for src, dst in plan["conns"]:
+        s_node, s_attr = src.split('.', 1); d_node, d_attr = dst.split('.', 1)
+        if s_node not in created or d_node not in created:
             continue
         try:
-            cmds.connectAttr(f"{s_new}.{s_attr}", f"{d_new}.{d_attr}", f=True)
-        except Exception:
-            pass
+            cmds.connectAttr(f"{created[s_node]}.{s_attr}", f"{created[d_node]}.{d_attr}", f=True)
+        except Exception as e:
+            result.failed.append((dst, "connect from %s: %s" % (src, e)))
+
+    for mat, sg_name in plan["shading"]:
+        real = created.get(mat)
+        if not real:
+            continue
+        try:
+            se = cmds.sets(renderable=True, noSurfaceShader=True, empty=True, name=sg_name)
+            cmds.connectAttr(real + ".outColor", se + ".surfaceShader", f=True)
+        except Exception as e:
+            result.failed.append((sg_name, str(e)))
 
+    result.materials = [created.get(m, "") for m in result.materials]
+    result.rename_maps = [{o: created[n] for o, n in rm.items() if n in created} for rm in result.rename_maps]
+
+
+@mp.timed("util.rebuild_material_networks")
+def rebuild_material_networks(jobs, namespace: str = "MLI", blob_store=None) -> RebuildResult:
     
-    mat_new = rename_map.get(mat_old)
-    if mat_new:
-        se = get_shading_engine(mat_new)
-        if not se:
-            se = cmds.sets(renderable=True, noSurfaceShader=True, empty=True, name=f"{mat_new}SG")
+    # jobs: [(snapshot, new_material_name[, textures]), ...] applied as one batch
+    result = RebuildResult()
+    if not cmds or not jobs:
+        return result
+    if any(len(j) < 3 or j[2] is None for j in jobs):
+        # texture writes run on the I/O pool while the plan is built
+        dst_dir = _ensure_sourceimages()
+        jobs = [j if len(j) > 2 and j[2] is not None else (j[0], j[1], materialize_embeds(j[0], blob_store, dst_dir))
+                for j in jobs]
+    plan = _plan_rebuild(jobs, namespace, blob_store, result)
+    planned = list(result.failed)
+    undo_open = False
+    try:
+        cmds.undoInfo(openChunk=True, chunkName="MLI_Rebuild"); undo_open = True
+    except Exception:
+        pass
+    try:
+        if om:
             try:
-                cmds.connectAttr(mat_new + ".outColor", se + ".surfaceShader", f=True)
-            except Exception:
-                pass
+                _apply_plan_api(plan, result)
+                return result
+            except Exception as e:
+                # nothing was applied (or it was rolled back); redo the batch command by command
+                result.failed = planned + [("MDGModifier", str(e))]
+        _apply_plan_cmds(plan, result)
+    finally:
+        if undo_open:
+            cmds.undoInfo(closeChunk=True)
+    return result
+
 
-    return mat_new or ""
+@mp.timed("util.rebuild_material_network")
+def rebuild_material_network(snapshot: dict, new_material_name: str = None, namespace: str = "MLI", blob_store=None):
+    
+    if not cmds or not snapshot:
+        return ""
+    return rebuild_material_networks([(snapshot, new_material_name)], namespace, blob_store).materials[0]
@@ -1,6 +1,24 @@
 import importlib
+import maya.cmds as cmds
+import MaterialLibrary.MaliProfile as MP
+import MaterialLibrary.MaliCodec as MC
+import MaterialLibrary.MaliStore as MS
+import MaterialLibrary.MaliIndex as MI
 import MaterialLibrary.MaliUtil as MU
+import MaterialLibrary.MaliQt as MQ
 import MaterialLibrary.MaliUI  as UI
+# MaliUndoCmd is a Maya plugin (MaliUtil loads it on first rebuild): unload it so an
+# edited copy is picked up; Maya refuses while its commands are still in the undo queue
+try:
+    if cmds.pluginInfo("MaliUndoCmd", q=True, loaded=True):
+        cmds.unloadPlugin("MaliUndoCmd")
+except Exception:
+    pass
+importlib.reload(MP)
+importlib.reload(MC)
+importlib.reload(MS)
+importlib.reload(MI)
 importlib.reload(MU)
+importlib.reload(MQ)
 importlib.reload(UI)
 UI.run()
@@ -0,0 +1,389 @@
+
+# In-memory stand-in for maya.cmds, enough of it for MaliUtil / MaliUI to run
+# headless: typed attributes, plugs and connections, shadingEngine sets and
+# transform/shape parenting. install() registers it as maya.cmds (and an empty
+# maya.OpenMayaUI); OpenMaya is left out so MaliUtil takes its cmds paths.
+
+import os, re, sys, types, itertools, collections
+
+
+# node type -> {attr: (type, default)}
+TYPES = {
+    "lambert": {"color": ("float3", (0.5, 0.5, 0.5)), "transparency": ("float3", (0.0, 0.0, 0.0)),
+                "ambientColor": ("float3", (0.0, 0.0, 0.0)), "incandescence": ("float3", (0.0, 0.0, 0.0)),
+                "diffuse": ("float", 0.8), "translucence": ("float", 0.0), "glowIntensity": ("float", 0.0),
+                "caching": ("bool", False), "nodeState": ("enum", 0)},
+    "file": {"fileTextureName": ("string", ""), "colorSpace": ("string", "sRGB"), "alphaGain": ("float", 1.0),
+             "alphaOffset": ("float", 0.0), "colorGain": ("float3", (1.0, 1.0, 1.0)), "filterType": ("enum", 1),
+             "uvCoord": ("float2", (0.0, 0.0)), "caching": ("bool", False)},
+    "place2dTexture": {"repeatU": ("float", 1.0), "repeatV": ("float", 1.0), "rotateFrame": ("doubleAngle", 0.0),
+                       "offsetU": ("float", 0.0), "offsetV": ("float", 0.0), "wrapU": ("bool", True)},
+    "shadingEngine": {}, "transform": {}, "mesh": {},
+}
+TYPES["aiStandardSurface"] = dict(TYPES["lambert"], baseColor=("float3", (0.8, 0.8, 0.8)), base=("float", 1.0),
+                                  specular=("float", 1.0), specularRoughness=("float", 0.2), metalness=("float", 0.0),
+                                  coat=("float", 0.0), emission=("float", 0.0))
+MATERIAL_TYPES = {"lambert", "aiStandardSurface"}
+DAG_TYPES = {"transform", "mesh"}
+CLASSIFICATION = {"lambert": "shader/surface", "aiStandardSurface": "shader/surface",
+                  "file": "texture/2d", "place2dTexture": "utility/general"}
+
+
+class Scene(object):
+
+    def __init__(self):
+        self.nodes = {}                                 # name -> {"type": t, "attrs": {}}
+        self.src = {}                                   # dst plug -> src plug
+        self.inputs = collections.defaultdict(set)      # node -> its connected dst plugs
+        self.outputs = collections.defaultdict(set)     # node -> dst plugs fed by it
+        self.members = {}                               # shadingEngine -> [member]
+        self.member_of = {}                             # member -> shadingEngine
+        self.parent = {}                                # shape -> transform
+        self.children = collections.defaultdict(list)   # transform -> shapes
+        self.selection = []
+        self.file_info = {}
+        self.calls = collections.Counter()              # cmds function -> call count
+
+
+S = Scene()
+_ids = itertools.count(1)
+
+
+def reset():
+    global S
+    S = Scene()
+
+
+def _counted(fn):
+    def wrapper(*a, **kw):
+        S.calls[fn.__name__] += 1
+        return fn(*a, **kw)
+    wrapper.__name__ = fn.__name__
+    return wrapper
+
+
+def _node(plug):
+    return plug.split(".", 1)[0]
+
+
+def _flat(args):
+    out = []
+    for a in args:
+        out.extend(a if isinstance(a, (list, tuple, set)) else [a])
+    return out
+
+
+def _new_name(base):
+    if base not in S.nodes:
+        return base
+    m = re.match(r"^(.*?)(\d+)$", base)
+    stem = m.group(1) if m else base
+    for i in itertools.count(1):
+        if "%s%d" % (stem, i) not in S.nodes:
+            return "%s%d" % (stem, i)
+
+
+# ---- nodes ----
+
+@_counted
+def createNode(ntype, name=None, skipSelect=False, parent=None, **kw):
+    if ntype not in TYPES:
+        raise RuntimeError("Unknown object type: %s" % ntype)
+    n = _new_name(name or "%s%d" % (ntype, next(_ids)))
+    S.nodes[n] = {"type": ntype, "attrs": {a: list(d) if isinstance(d, tuple) else d for a, (t, d) in TYPES[ntype].items()}}
+    if parent: S.parent[n] = parent; S.children[parent].append(n)
+    return n
+
+
+def shadingNode(ntype, asShader=False, asTexture=False, asUtility=False, name=None, **kw):
+    return createNode(ntype, name=name)
+
+
+@_counted
+def objExists(n):
+    return _node(n) in S.nodes
+
+
+@_counted
+def nodeType(n, **kw):
+    return S.nodes[_node(n)]["type"]
+
+
+@_counted
+def objectType(n, isAType=None, **kw):
+    t = S.nodes[_node(n)]["type"]
+    return t in DAG_TYPES if isAType == "dagNode" else t
+
+
+@_counted
+def ls(*args, **kw):
+    if kw.get("sl") or kw.get("selection"):
+        pool = list(S.selection)
+    elif args:
+        pool = [n for n in _flat(args) if _node(n) in S.nodes]
+    else:
+        pool = list(S.nodes)
+    typ = kw.get("type") or kw.get("typ")
+    if typ:
+        want = set(typ if isinstance(typ, (list, tuple)) else [typ])
+        dag = "dagNode" in want
+        pool = [n for n in pool if S.nodes[_node(n)]["type"] in want or (dag and S.nodes[_node(n)]["type"] in DAG_TYPES)]
+    if kw.get("materials") or kw.get("mat"):
+        pool = [n for n in pool if S.nodes[_node(n)]["type"] in MATERIAL_TYPES]
+    if kw.get("transforms") or kw.get("tr"):
+        pool = [n for n in pool if S.nodes[_node(n)]["type"] == "transform"]
+    if kw.get("showType") or kw.get("st"):
+        return list(itertools.chain.from_iterable((n, S.nodes[_node(n)]["type"]) for n in pool))
+    return pool
+
+
+@_counted
+def listAttr(node, settable=False, userDefined=False, **kw):
+    return [] if userDefined else list(S.nodes[_node(node)]["attrs"])
+
+
+@_counted
+def getAttr(plug, type=False, **kw):
+    n, a = plug.split(".", 1)
+    node = S.nodes.get(n)
+    if node is None or a not in node["attrs"]:
+        raise RuntimeError("No object matches name: %s" % plug)
+    if type:
+        return TYPES[node["type"]][a][0]
+    v = node["attrs"][a]
+    return [tuple(v)] if isinstance(v, list) else v
+
+
+@_counted
+def setAttr(plug, *vals, **kw):
+    n, a = plug.split(".", 1)
+    node = S.nodes.get(n)
+    if node is None or a not in node["attrs"]:
+        raise RuntimeError("No object matches name: %s" % plug)
+    node["attrs"][a] = list(vals) if len(vals) > 1 else vals[0]
+
+
+@_counted
+def rename(old, new):
+    new = _new_name(new)
+    S.nodes[new] = S.nodes.pop(old)
+    for dst in list(S.inputs.pop(old, ())):
+        src = S.src.pop(dst); dst2 = new + dst[len(old):]
+        S.src[dst2] = src; S.inputs[new].add(dst2); S.outputs[_node(src)].discard(dst); S.outputs[_node(src)].add(dst2)
+    for dst in list(S.outputs.pop(old, ())):
+        S.src[dst] = new + S.src[dst][len(old):]; S.outputs[new].add(dst)
+    if old in S.members:
+        S.members[new] = S.members.pop(old)
+        for m in S.members[new]: S.member_of[m] = new
+    se = S.member_of.pop(old, None)
+    if se:
+        S.members[se] = [new if m == old else m for m in S.members[se]]; S.member_of[new] = se
+    if old in S.parent:
+        p = S.parent.pop(old); S.parent[new] = p
+        S.children[p] = [new if c == old else c for c in S.children[p]]
+    for c in S.children.pop(old, ()):
+        S.parent[c] = new; S.children[new].append(c)
+    return new
+
+
+@_counted
+def delete(*names, **kw):
+    for n in _flat(names):
+        if n not in S.nodes: continue
+        for dst in list(S.inputs.get(n, ())) + list(S.outputs.get(n, ())):
+            _disconnect(dst)
+        S.nodes.pop(n)
+        for m in S.members.pop(n, ()): S.member_of.pop(m, None)
+        se = S.member_of.pop(n, None)
+        if se: S.members[se] = [m for m in S.members[se] if m != n]
+        p = S.parent.pop(n, None)
+        if p: S.children[p] = [c for c in S.children[p] if c != n]
+        for c in S.children.pop(n, ()):
+            delete(c)
+
+
+# ---- connections ----
+
+def _disconnect(dst):
+    src = S.src.pop(dst, None)
+    if src is None: return
+    S.inputs[_node(dst)].discard(dst); S.outputs[_node(src)].discard(dst)
+
+
+@_counted
+def connectAttr(src, dst, f=False, force=False, **kw):
+    if _node(src) not in S.nodes or _node(dst) not in S.nodes:
+        raise RuntimeError("The source or destination node does not exist: %s -> %s" % (src, dst))
+    if dst in S.src:
+        if not (f or force):
+            raise RuntimeError("%s already has an incoming connection" % dst)
+        _disconnect(dst)
+    S.src[dst] = src
+    S.inputs[_node(dst)].add(dst); S.outputs[_node(src)].add(dst)
+
+
+@_counted
+def disconnectAttr(src, dst, **kw):
+    if S.src.get(dst) == src: _disconnect(dst)
+
+
+@_counted
+def connectionInfo(plug, isDestination=False, **kw):
+    return plug in S.src
+
+
+@_counted
+def listConnections(nodes=None, c=False, p=False, s=True, d=True, type=None, **kw):
+    out = []
+    for n in _flat([nodes]) if nodes is not None else []:
+        node, attr = (n.split(".", 1) + [None])[:2]
+        pairs = []
+        if s:
+            pairs += [(dst, S.src[dst]) for dst in S.inputs.get(node, ()) if attr is None or dst == n]
+        if d:
+            pairs += [(S.src[dst], dst) for dst in S.outputs.get(node, ()) if attr is None or S.src[dst] == n]
+        for mine, other in sorted(pairs):
+            if type and S.nodes[_node(other)]["type"] != type: continue
+            out += ([mine] if c else []) + [other if p else _node(other)]
+    return out or None
+
+
+@_counted
+def listHistory(node, future=False, **kw):
+    seen, stack = [], [node]
+    while stack:
+        n = stack.pop()
+        if n in seen: continue
+        seen.append(n)
+        stack.extend(_node(S.src[dst]) for dst in sorted(S.inputs.get(n, ())))
+    return seen
+
+
+# ---- sets, DAG, selection ----
+
+@_counted
+def sets(*args, **kw):
+    if kw.get("q") or kw.get("query"):
+        return list(S.members.get(args[0], [])) or None
+    if kw.get("empty"):
+        n = createNode("shadingEngine", name=kw.get("name"))
+        S.members[n] = []
+        return n
+    if kw.get("rm") or kw.get("remove"):
+        se = kw.get("rm") or kw.get("remove")
+        drop = {m for m in _flat(args) if S.member_of.get(m) == se}
+        S.members[se] = [m for m in S.members.get(se, []) if m not in drop]
+        for m in drop: S.member_of.pop(m, None)
+        return None
+    target = kw.get("forceElement") or kw.get("fe")
+    if target:
+        objs = _flat(args); moving = set(objs)
+        for se in {S.member_of[m] for m in objs if m in S.member_of}:
+            S.members[se] = [m for m in S.members[se] if m not in moving]
+        S.members.setdefault(target, []).extend(objs)
+        for m in objs: S.member_of[m] = target
+    return None
+
+
+@_counted
+def listRelatives(n, p=False, parent=False, s=False, shapes=False, **kw):
+    if p or parent:
+        return [S.parent[x] for x in _flat([n]) if x in S.parent] or None
+    if s or shapes:
+        return [c for x in _flat([n]) for c in S.children.get(x, ())] or None
+    return None
+
+
+def select(*args, **kw):
+    if kw.get("clear") or kw.get("cl"):
+        S.selection = []; return
+    objs = _flat(args)
+    S.selection = objs if kw.get("r", True) else S.selection + objs
+
+
+def hyperShade(assign=None, **kw):
+    se = next((_node(dst) for dst in S.outputs.get(assign, ()) if dst.endswith(".surfaceShader")), None)
+    if se:
+        shapes = [c for x in S.selection for c in S.children.get(x, ())] or list(S.selection)
+        sets(shapes, forceElement=se)
+
+
+def getClassification(ntype, **kw):
+    return [CLASSIFICATION.get(ntype, "utility/general")]
+
+
+# ---- environment ----
+
+WORKSPACE = os.path.join(os.path.expanduser("~"), ".mli_bench_ws")
+
+
+def workspace(*a, **kw):
+    return WORKSPACE + "/"
+
+
+def file(*a, **kw):
+    return ""
+
+
+def fileInfo(*a, **kw):
+    if kw.get("q"):
+        v = S.file_info.get(a[0]) if a else None
+        return [v] if v else []
+    if len(a) == 2: S.file_info[a[0]] = a[1]
+    return None
+
+
+def scriptJob(*a, **kw):
+    return next(_ids)
+
+
+def undoInfo(*a, **kw):
+    return True if kw.get("q") else None
+
+
+def HypershadeWindow(*a, **kw):
+    pass
+
+
+def install():
+    maya = sys.modules.get("maya") or types.ModuleType("maya")
+    maya.__path__ = getattr(maya, "__path__", [])
+    mod = sys.modules[__name__]
+    maya.cmds = mod
+    sys.modules["maya"] = maya
+    sys.modules["maya.cmds"] = mod
+    sys.modules.setdefault("maya.OpenMayaUI", types.ModuleType("maya.OpenMayaUI"))
+    return mod
+
+
+# ---- scene builders ----
+
+def make_material(name, ntype="lambert", texture=None, objects=0):
+    # shader (+ file/place2dTexture when texture is a path) + shadingEngine with
+    # `objects` transform/mesh pairs assigned to it; returns (material, sg)
+    mat = shadingNode(ntype, asShader=True, name=name)
+    if texture:
+        f = shadingNode("file", asTexture=True, name=name + "_file")
+        p2d = shadingNode("place2dTexture", asUtility=True, name=name + "_p2d")
+        setAttr(f + ".fileTextureName", texture, type="string")
+        connectAttr(p2d + ".outUV", f + ".uvCoord")
+        connectAttr(f + ".outColor", mat + (".baseColor" if ntype == "aiStandardSurface" else ".color"))
+    setAttr(mat + ".diffuse", 0.6)
+    se = sets(renderable=True, noSurfaceShader=True, empty=True, name=name + "SG")
+    connectAttr(mat + ".outColor", se + ".surfaceShader")
+    for k in range(objects):
+        t = createNode("transform", name="%s_geo%d" % (name, k))
+        sh = createNode("mesh", name="%s_geo%dShape" % (name, k), parent=t)
+        sets([sh], forceElement=se)
+    return mat, se
+
+
+def build_scene(n_materials, objects_per_material=2, textures=(), prefix="mat"):
+    # textures: image paths cycled over every other material
+    reset()
+    mats = []
+    for i in range(n_materials):
+        tex = textures[i % len(textures)] if textures and i % 2 == 0 else None
+        ntype = "aiStandardSurface" if i % 3 == 0 else "lambert"
+        mats.append(make_material("%s%d" % (prefix, i), ntype, tex, objects_per_material)[0])
+    return mats
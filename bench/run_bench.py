@@ -0,0 +1,243 @@
+
+# Headless benchmarks for MaliUtil / MaliStore / MaliUI on the in-memory
+# maya.cmds stand-in (fake_maya.py). Qt runs offscreen; the UI cases are
+# skipped when PySide is not importable.
+#
+#   python bench/run_bench.py                                  # 10 / 100 / 1,000 / 10,000 materials
+#   python bench/run_bench.py --sizes 10 100 --only capture save
+#   python bench/run_bench.py --save bench/results/mine.json
+#   python bench/run_bench.py --compare bench/results/baseline.json
+#
+# Every case reports the best of --repeat runs in seconds. --compare prints the
+# ratio against a stored result and exits 1 when a case got slower than
+# --threshold (and by more than --min-delta seconds).
+#
+# fake_maya has no OpenMaya (MaliUtil.om is None): capture and rebuild time the
+# maya.cmds fallback only, never the API / MDGModifier path used inside Maya.
+
+import os, sys, json, time, base64, shutil, argparse, platform, tempfile, datetime
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import fake_maya
+fake_maya.install()
+
+import MaliStore as ms
+import MaliUtil as mu
+
+try:
+    from PySide6 import QtWidgets
+except Exception:
+    try: from PySide2 import QtWidgets
+    except Exception: QtWidgets = None
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+OBJECTS_PER_MATERIAL = 2
+DIALOG_SIZE = (1200, 800)
+# 1x1 PNG, used as thumbnail and texture content
+_PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==")
+
+
+class Context(object):
+    # scratch files shared by every case of one run
+
+    def __init__(self):
+        self.tmp = tempfile.mkdtemp(prefix="mli_bench_")
+        fake_maya.WORKSPACE = os.path.join(self.tmp, "ws")
+        self.textures = []
+        for i in range(8):
+            p = os.path.join(self.tmp, "tex", "tex%d.png" % i)
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            with open(p, "wb") as f: f.write(_PNG + bytes([i]))
+            self.textures.append(p)
+        self._snaps = {}
+        self.app = None
+
+    def scene(self, n):
+        mu.clear_type_schemas()
+        return fake_maya.build_scene(n, OBJECTS_PER_MATERIAL, self.textures)
+
+    def snapshots(self, n):
+        if n not in self._snaps:
+            mats = self.scene(n)
+            self._snaps[n] = [mu.capture_material_network(m) for m in mats]
+        return self._snaps[n]
+
+    def library(self, n):
+        thumb = base64.b64encode(_PNG).decode("ascii")
+        lib = {}
+        for i, snap in enumerate(self.snapshots(n)):
+            lib.setdefault("Folder %d" % (i // 100), []).append({
+                "id": "bench%06d" % i, "name": snap.get("material", ""), "thumb_b64": thumb,
+                "assets": ["%s_geo%d" % (snap.get("material", ""), k) for k in range(OBJECTS_PER_MATERIAL)],
+                "graph": json.loads(json.dumps(snap))})
+        return lib
+
+    def dialog(self):
+        if self.app is None:
+            self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+            import MaliUI
+            self.dlg = MaliUI.MaterialLibraryDialog()
+        return self.dlg
+
+    def scratch(self, name):
+        path = os.path.join(self.tmp, name)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    def close(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def _clock(fn):
+    t = time.perf_counter(); fn()
+    return time.perf_counter() - t
+
+
+# ---- cases: case(ctx, n) -> seconds of the measured part ----
+
+def case_capture(ctx, n):
+    mats = ctx.scene(n)
+    return _clock(lambda: [mu.capture_material_network(m) for m in mats])
+
+
+def case_rebuild(ctx, n):
+    snaps = ctx.snapshots(n)
+    fake_maya.reset()
+    shutil.rmtree(fake_maya.WORKSPACE, ignore_errors=True)
+    jobs = [(s, s.get("material")) for s in snaps]
+    return _clock(lambda: mu.rebuild_material_networks(jobs))
+
+
+def case_objects_using_material(ctx, n):
+    mats = ctx.scene(n)
+    return _clock(lambda: [mu.objects_using_material(m, True) for m in mats])
+
+
+def case_scan_assignments(ctx, n):
+    mats = ctx.scene(n)
+    return _clock(lambda: mu.scan_material_assignments(mats))
+
+
+def case_save(ctx, n):
+    lib = ctx.library(n)
+    path = os.path.join(ctx.scratch("save"), "lib.json")
+    ids = {m["id"] for mats in lib.values() for m in mats}
+    return _clock(lambda: ms.LibraryStore(path).save(lib, ids))
+
+
+def case_load(ctx, n):
+    lib = ctx.library(n)
+    path = os.path.join(ctx.scratch("load"), "lib.json")
+    ms.LibraryStore(path).save(lib, {m["id"] for mats in lib.values() for m in mats})
+    return _clock(lambda: ms.LibraryStore(path).load())
+
+
+def case_load_bodies(ctx, n):
+    lib = ctx.library(n)
+    path = os.path.join(ctx.scratch("bodies"), "lib.json")
+    store = ms.LibraryStore(path)
+    store.save(lib, {m["id"] for mats in lib.values() for m in mats})
+    loaded = store.load()
+    return _clock(lambda: [ms.load_graph(m, [store]) for mats in loaded.values() for m in mats])
+
+
+def case_refresh_tree(ctx, n):
+    ctx.scene(n)
+    d = ctx.dialog()
+    d.lib_data = ctx.library(n)
+    t = _clock(d._refresh_tree)
+    ctx.app.processEvents()
+    return t
+
+
+def case_rebuild_cards(ctx, n):
+    ctx.scene(n)
+    d = ctx.dialog()
+    d.lib_data = ctx.library(n); d._refresh_tree()
+    d.show(); d.resize(*DIALOG_SIZE); ctx.app.processEvents()
+    mats = [m for v in d.lib_data.values() for m in v]
+    def _run():
+        # model reset plus one synchronous paint of the visible cards
+        d._rebuild_cards(mats); ctx.app.processEvents()
+        d.cards_view.viewport().repaint()
+    return _clock(_run)
+
+
+CASES = [("capture", case_capture, False), ("rebuild", case_rebuild, False),
+         ("objects_using_material", case_objects_using_material, False),
+         ("scan_assignments", case_scan_assignments, False),
+         ("save", case_save, False), ("load", case_load, False), ("load_bodies", case_load_bodies, False),
+         ("refresh_tree", case_refresh_tree, True), ("rebuild_cards", case_rebuild_cards, True)]
+
+
+def run(sizes, repeat, only=None, log=print):
+    ctx = Context()
+    results = {}
+    try:
+        for name, fn, needs_qt in CASES:
+            if only and name not in only: continue
+            if needs_qt and QtWidgets is None:
+                log("%-24s skipped (no PySide)" % name); continue
+            for n in sizes:
+                best = min(fn(ctx, n) for _ in range(repeat))
+                results.setdefault(name, {})[str(n)] = round(best, 6)
+                log("%-24s %6d  %10.4f s" % (name, n, best))
+    finally:
+        ctx.close()
+    return results
+
+
+def compare(results, baseline, threshold, min_delta, log=print):
+    # returns [(case, size, ratio)] that regressed
+    slow = []
+    log("\n%-24s %6s  %10s %10s %7s" % ("case", "size", "base", "now", "ratio"))
+    for name, by_size in sorted(results.items()):
+        for size, now in sorted(by_size.items(), key=lambda kv: int(kv[0])):
+            base = (baseline.get(name) or {}).get(size)
+            if base is None: continue
+            ratio = now / base if base else float("inf")
+            bad = ratio > threshold and now - base > min_delta
+            if bad: slow.append((name, size, ratio))
+            log("%-24s %6s  %10.4f %10.4f %6.2fx%s" % (name, size, base, now, ratio, "  SLOWER" if bad else ""))
+    return slow
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Material Library headless benchmarks")
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", nargs="+", choices=[c[0] for c in CASES])
+    ap.add_argument("--save", help="write results JSON here (default bench/results/latest.json)")
+    ap.add_argument("--compare", help="results JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=1.25)
+    ap.add_argument("--min-delta", type=float, default=0.002)
+    args = ap.parse_args(argv)
+
+    results = run(args.sizes, max(1, args.repeat), args.only)
+    out = args.save or os.path.join(BENCH_DIR, "results", "latest.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    doc = {"meta": {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(), "platform": platform.platform(),
+                    "qt": getattr(QtWidgets, "__name__", "none").split(".")[0],
+                    "openmaya": mu.om is not None,
+                    "repeat": args.repeat, "objects_per_material": OBJECTS_PER_MATERIAL},
+           "results": results}
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2, sort_keys=True); f.write("\n")
+    print("\nresults -> %s" % out)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results") or {}
+        if compare(results, baseline, args.threshold, args.min_delta):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+
+import os, sys, json, math, tempfile, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import MaliCodec as mc
+import MaliStore as ms
+
+
+def _attr(name, value, atype="float"):
+    return {"name": name, "value": value, "type": atype}
+
+
+def _graph(attrs, **extra):
+    g = {"material": "mat1",
+         "nodes": {"mat1": {"type": "lambert", "attrs": {a["name"]: a for a in attrs}},
+                   "file1": {"type": "file", "attrs": {"fileTextureName": _attr("fileTextureName", "tex/a.png", "string")}}},
+         "connections": [{"src": "file1.outColor", "dst": "mat1.color"}],
+         "sparse": True}
+    g.update(extra)
+    return g
+
+
+def _roundtrip(g):
+    return mc.decode_graph(mc.encode_graph(g))
+
+
+class RoundTrip(unittest.TestCase):
+    # the contract: decode(encode(g)) == json.loads(json.dumps(g))
+
+    def check(self, g):
+        self.assertEqual(_roundtrip(g), json.loads(json.dumps(g)))
+
+    def test_capture_shape(self):
+        self.check(_graph([_attr("diffuse", 0.8), _attr("color", [0.5, 0.25, 1.0], "float3"),
+                           _attr("refractions", True, "bool"), _attr("refractionLimit", 6, "short"),
+                           _attr("matteOpacityMode", 2, "enum")]))
+
+    def test_empty_and_missing(self):
+        self.check({})
+        self.check({"material": "m", "nodes": {}, "connections": []})
+        self.check({"material": "m"})
+
+    def test_float32_selection(self):
+        # exact float32 values take the narrow column, the rest stay float64 bit for bit
+        narrow = mc.encode_graph(_graph([_attr("a", 0.5), _attr("b", [0.25, 2.0], "float2")]))
+        wide = mc.encode_graph(_graph([_attr("a", 0.1), _attr("b", [0.2, 2.0], "float2")]))
+        self.assertEqual(len(wide) - len(narrow), 4 + 2 * 4)
+        for v in (0.1, 1.0 / 3.0, 1e-300, 3.4028234663852886e38, 1e39, -0.0, 16777217.0):
+            back = _roundtrip(_graph([_attr("a", v)]))["nodes"]["mat1"]["attrs"]["a"]["value"]
+            self.assertIs(type(back), float)
+            self.assertEqual(back.hex(), v.hex())
+        vec = _roundtrip(_graph([_attr("v", [0.5, 0.1, 1e39], "double3")]))["nodes"]["mat1"]["attrs"]["v"]["value"]
+        self.assertEqual([x.hex() for x in vec], [x.hex() for x in (0.5, 0.1, 1e39)])
+
+    def test_nan_and_inf(self):
+        g = _graph([_attr("n", float("nan")), _attr("i", float("inf")), _attr("j", float("-inf"), "double"),
+                    _attr("v", [float("nan"), 1.0], "float2")])
+        attrs = _roundtrip(g)["nodes"]["mat1"]["attrs"]
+        self.assertTrue(math.isnan(attrs["n"]["value"]))
+        self.assertEqual(attrs["i"]["value"], float("inf"))
+        self.assertEqual(attrs["j"]["value"], float("-inf"))
+        self.assertTrue(math.isnan(attrs["v"]["value"][0]))
+        self.assertEqual(attrs["v"]["value"][1], 1.0)
+
+    def test_ints_and_bools_keep_their_type(self):
+        g = _graph([_attr("t", True, "bool"), _attr("f", False, "bool"), _attr("one", 1, "long"),
+                    _attr("zero", 0, "long"), _attr("big", 1 << 40, "long"), _attr("low", -(1 << 31), "long"),
+                    _attr("high", (1 << 31) - 1, "long")])
+        attrs = _roundtrip(g)["nodes"]["mat1"]["attrs"]
+        for name, v in (("t", True), ("f", False), ("one", 1), ("zero", 0), ("big", 1 << 40),
+                        ("low", -(1 << 31)), ("high", (1 << 31) - 1)):
+            self.assertIs(type(attrs[name]["value"]), type(v))
+            self.assertEqual(attrs[name]["value"], v)
+
+    def test_strings(self):
+        self.check(_graph([_attr("s", "", "string"), _attr("u", "Téxture ทดสอบ \U0001f600", "string"),
+                           _attr("common", "lambert", "string"), _attr("dotted", "a.b.c", "string"),
+                           _attr("none_type", "x", None), _attr("quote", 'say "hi"\n\\', "string")]))
+        # node and attribute names that are not plain identifiers
+        self.check({"material": "ns:mat|x", "nodes": {"ns:mat|x": {"type": "été",
+                    "attrs": {"a[0].b": _attr("a[0].b", "v", "string")}}},
+                    "connections": [{"src": "ns:f.outColor.outColorR", "dst": "ns:mat|x.a[0].b"}]})
+
+    def test_nested_compounds(self):
+        self.check(_graph([_attr("matrix", [[1.0, 0.0], [0.0, 1.0]], "matrix"),
+                           _attr("ramp", [{"position": 0.0, "color": [1.0, 0.0, 0.0]}, {"position": 1.0}], "compound"),
+                           _attr("mixed", [1, 2.5, "x", None], "compound"),
+                           _attr("ints", [1, 2, 3], "long3"), _attr("empty", [], "compound"),
+                           _attr("none", None, None), _attr("dict", {"k": {"n": [0.1]}}, "compound")]))
+
+    def test_shapes_outside_the_columns(self):
+        g = _graph([_attr("a", 0.5)], extra_key={"x": [1, 2]}, sparse=False)
+        g["nodes"]["file1"]["embed"] = {"name": "a.png", "blob": "0" * 40 + ".png", "path": "tex/a.png"}
+        g["nodes"]["odd"] = {"type": "lambert", "attrs": {"x": {"name": "y", "value": 1, "type": "long"}}}
+        g["nodes"]["bare"] = "not a dict"
+        g["nodes"]["noattrs"] = {"type": "file"}
+        g["connections"].append({"src": "file1.outAlpha", "dst": "mat1.transparency", "extra": 1})
+        self.check(g)
+        g["connections"] = [{"src": "nodot", "dst": "mat1.color"}]
+        self.check(g)
+        g["nodes"] = ["not", "a", "dict"]
+        self.check(g)
+
+    def test_key_order(self):
+        g = _graph([_attr("b", 1.0), _attr("a", 2.0)])
+        g = {"sparse": g["sparse"], "connections": g["connections"], "nodes": g["nodes"], "material": g["material"]}
+        back = _roundtrip(g)
+        self.assertEqual(list(back), list(g))
+        self.assertEqual(list(back["nodes"]["mat1"]["attrs"]), ["b", "a"])
+
+    def test_wide_indices(self):
+        # more strings than a u16 index holds switches to u32 columns
+        self.check(_graph([_attr("a%d" % i, "v%d" % i, "string") for i in range(40000)]))
+
+    def test_json_conversion(self):
+        g = _graph([_attr("a", 0.1), _attr("s", "x", "string")])
+        text = mc.graph_to_json(mc.graph_from_json(json.dumps(g)))
+        self.assertEqual(json.loads(text), g)
+
+    def test_rejects_other_data(self):
+        with self.assertRaises(ValueError):
+            mc.decode_graph(b'{"graph": {}}')
+
+
+class PackedBodies(unittest.TestCase):
+    # version 3 libraries may hold <id>.mlg bodies: still read, replaced by JSON on rewrite
+
+    def test_read_and_rewrite(self):
+        with tempfile.TemporaryDirectory() as d:
+            store = ms.LibraryStore(os.path.join(d, "lib.json"))
+            os.makedirs(store.body_dir)
+            g = _graph([_attr("a", 0.1), _attr("n", [0.5, 0.25], "float2")])
+            packed = os.path.join(store.body_dir, "m1" + ms.PACKED_EXT)
+            with open(packed, "wb") as f: f.write(mc.encode_graph(g))
+            self.assertTrue(store.has_body("m1"))
+            self.assertEqual(store.load_body("m1"), {"graph": g})
+
+            m = {"id": "m1", "name": "mat1", "assets": []}
+            store.save({"F": [m]}, dirty_ids={"m1"})
+            self.assertFalse(os.path.exists(packed))
+            self.assertTrue(os.path.isfile(store.body_path("m1")))
+            self.assertEqual(store.load_body("m1"), {"graph": g})
+
+
+if __name__ == "__main__":
+    unittest.main()